@@ -1,23 +1,74 @@
 """
 Terminal Extensions - An extensible framework for intercepting and augmenting terminal commands.
 
-This module provides an API for creating two types of hooks:
+This module provides an API for creating three types of hooks:
 1. terminal_interceptor: Can modify, block, or replace commands before execution
 2. terminal_callback: Executed after a command completes, with access to command results
+3. terminal_stream_callback: Receives command output as it is produced
 
 Hooks can be registered via decorators or loaded from external Python modules.
 """
 
+import asyncio
+import contextlib
+import errno
+import functools
+import heapq
 import importlib.util
+import io
+import locale
 import os
 import platform
+import re
+import secrets
+import select
+import shlex
+import signal
 import subprocess
 import sys
+import time
+import zlib
 from enum import Enum
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Tuple, Union
-
-from terminal_extensions.type_alias import CallbackFunc, InterceptorFunc
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from terminal_extensions.type_alias import (
+    AsyncExecuteFunc,
+    CallbackFunc,
+    ExecuteFunc,
+    InterceptorChainFunc,
+    InterceptorFunc,
+    StreamExecuteFunc,
+)
+
+# maximum number of bytes read from a pipe at a time when streaming output
+_CHUNK_SIZE = 65536
+
+# resolved once, rather than on every command
+_IS_WINDOWS = platform.system() == "Windows"
+_DEFAULT_SHELL = os.environ.get("SHELL", "/bin/sh")
+
+# Python creates file descriptors non-inheritable (PEP 446), so on POSIX systems
+# there is nothing for close_fds to close in the child, and leaving it off lets
+# subprocess start commands with posix_spawn instead of fork and exec
+_CLOSE_FDS = _IS_WINDOWS
 
 
 class HookType(Enum):
@@ -25,18 +76,255 @@ class HookType(Enum):
 
     INTERCEPTOR = "interceptor"  # runs before command execution, can modify or block
     CALLBACK = "callback"  # runs after command execution
+    STREAM_CALLBACK = "stream_callback"  # receives output during command execution
+
+
+class StreamingCallback:
+    """
+    Base class for callbacks that receive command output as it is produced.
+
+    Subclass it and override on_chunk and/or on_finish. Commands with a matching
+    streaming callback have their output streamed through a pipe instead of
+    being buffered, so the callback can follow long-running commands.
+    """
+
+    def on_chunk(self, command: str, stream: str, data: bytes) -> None:
+        """
+        Handle a chunk of command output.
+
+        Args:
+            command: The command as originally entered
+            stream: "stdout" or "stderr"
+            data: The raw output bytes
+        """
+
+    def on_finish(self, command: str, return_code: int) -> None:
+        """
+        Handle command completion.
+
+        Args:
+            command: The command as originally entered
+            return_code: The command's return code
+        """
+
+
+F = TypeVar("F")
+T = TypeVar("T")
+S = TypeVar("S", bound="StreamingCallback")
+
+
+class _TrieNode(Generic[F]):
+    """Node in the character-level prefix trie used to index prefixed hooks."""
+
+    __slots__ = ("children", "hooks")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _TrieNode[F]] = {}
+        # (seq, hook) pairs for hooks whose prefix ends at this node
+        self.hooks: List[Tuple[int, F]] = []
+
+
+class _HookIndex(Generic[F]):
+    """
+    Index of hooks of a single type, keyed by command prefix.
+
+    Prefixed hooks live in a prefix trie, and each hook is tagged with a sequence
+    number so the matching hooks can be yielded in registration order. Commands
+    are first classified by a single regex over all registered prefixes, which
+    finds the longest prefix that applies; every shorter matching prefix lies on
+    its trie path, so the merged hooks are computed once per longest prefix.
+    """
+
+    __slots__ = (
+        "_prefix_index",
+        "_prefix_regex",
+        "_seq",
+        "_snapshot",
+        "entries",
+        "global_hooks",
+        "root",
+        "unprefixed",
+    )
+
+    def __init__(self) -> None:
+        self.entries: List[Tuple[Optional[str], F]] = []
+        self.root: _TrieNode[F] = _TrieNode()
+        # hooks without a prefix, kept both bare for the no-match fast path and
+        # tagged with their sequence number for merging with prefixed hooks
+        self.global_hooks: List[F] = []
+        self.unprefixed: List[Tuple[int, F]] = []
+        self._seq = 0
+        self._snapshot: Optional[Tuple[Tuple[Optional[str], F], ...]] = None
+        # rebuilt lazily after the set of hooks changes
+        self._prefix_regex: Optional[re.Pattern[str]] = None
+        self._prefix_index: Dict[str, Tuple[F, ...]] = {}
+
+    def add(self, func: F, prefix: Optional[str], hook: Optional[F] = None) -> None:
+        """
+        Add a hook, applying to all commands if prefix is None.
+
+        func is what the registry reports, and hook, if given, what is dispatched
+        in its place, such as func wrapped in a cache.
+        """
+        if prefix is not None:
+            # hooks sharing a prefix such as "git" then share a single string object
+            prefix = sys.intern(prefix)
+        if hook is None:
+            hook = func
+        entry = (self._seq, hook)
+        self._seq += 1
+        self.entries.append((prefix, func))
+        self._snapshot = None
+        self._prefix_regex = None
+        self._prefix_index.clear()
+
+        if prefix is None:
+            self.global_hooks.append(hook)
+            self.unprefixed.append(entry)
+            return
+
+        node = self.root
+        for char in prefix:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        node.hooks.append(entry)
+
+    def snapshot(self) -> Tuple[Tuple[Optional[str], F], ...]:
+        """Return the (prefix, hook) pairs in registration order, cached until modified."""
+        if self._snapshot is None:
+            self._snapshot = tuple(self.entries)
+        return self._snapshot
+
+    def iter_matching(self, command: str) -> Iterator[F]:
+        """Iterate the hooks that apply to command, in registration order."""
+        regex = self._prefix_regex
+        if regex is None:
+            regex = self._prefix_regex = self._compile_prefixes()
+        match = regex.match(command)
+        if match is None:
+            # no prefixed hook applies, so the global hooks run as-is
+            return iter(self.global_hooks)
+
+        prefix = match.group()
+        hooks = self._prefix_index.get(prefix)
+        if hooks is None:
+            hooks = self._prefix_index[prefix] = tuple(self._walk(prefix))
+        return iter(hooks)
+
+    def _compile_prefixes(self) -> "re.Pattern[str]":
+        """Compile the registered prefixes into an alternation, longest first."""
+        prefixes = {prefix for prefix, _ in self.entries if prefix is not None}
+        if not prefixes:
+            return re.compile("(?!)")
+        # alternatives are tried in order, so the first match is the longest prefix
+        ordered = sorted(prefixes, key=len, reverse=True)
+        return re.compile("|".join(map(re.escape, ordered)))
+
+    def _walk(self, prefix: str) -> Iterator[F]:
+        """Merge the hooks of every registered prefix along the trie path of prefix."""
+        node = self.root
+        buckets = [node.hooks] if node.hooks else []
+        for char in prefix:
+            node = node.children[char]
+            if node.hooks:
+                buckets.append(node.hooks)
+
+        if len(buckets) == 1 and not self.unprefixed:
+            return (func for _, func in buckets[0])
+
+        # sequence numbers are unique, so the hooks themselves are never compared
+        return (func for _, func in heapq.merge(self.unprefixed, *buckets))
+
+    def clear(self) -> None:
+        """Remove all hooks."""
+        self.entries.clear()
+        self.root = _TrieNode()
+        self.global_hooks.clear()
+        self.unprefixed.clear()
+        self._snapshot = None
+        self._prefix_regex = None
+        self._prefix_index.clear()
 
 
 class HookRegistry:
     """Registry for managing terminal hooks."""
 
+    __slots__ = (
+        "_batch_depth",
+        "_batch_dirty",
+        "_cached_interceptors",
+        "_callbacks",
+        "_chains",
+        "_command_hooks",
+        "_interceptors",
+        "_stream_callbacks",
+        "_version",
+    )
+
     def __init__(self) -> None:
         """Initialize the hook registry."""
-        self._interceptors: List[Tuple[Optional[str], InterceptorFunc]] = []
-        self._callbacks: List[Tuple[Optional[str], CallbackFunc]] = []
+        self._interceptors: _HookIndex[InterceptorFunc] = _HookIndex()
+        self._callbacks: _HookIndex[CallbackFunc] = _HookIndex()
+        self._stream_callbacks: _HookIndex[StreamingCallback] = _HookIndex()
+        # the caches wrapping the interceptors registered with cache=True
+        self._cached_interceptors: List[functools._lru_cache_wrapper[Any]] = []
+        # compiled interceptor chains, keyed by the ids of the interceptors they
+        # run, since interceptors need not be hashable; the registry keeps them alive
+        self._chains: Dict[Tuple[int, ...], InterceptorChainFunc] = {}
+        # hooks of every type matching each command, resolved once for all stages
+        # of dispatch, so commands repeated from history skip prefix matching
+        self._command_hooks = functools.lru_cache(maxsize=1024)(self._resolve)
+        # bumped whenever hooks change, so iteration can detect modification
+        self._version = 0
+        # nesting depth of batch() blocks, and whether hooks changed inside them
+        self._batch_depth = 0
+        self._batch_dirty = False
+
+    def _invalidate(self) -> None:
+        """Discard state derived from the registered hooks."""
+        # bumped even inside batch(), so iteration still detects modification
+        self._version += 1
+        if self._batch_depth:
+            self._batch_dirty = True
+            return
+        self._chains.clear()
+        self._command_hooks.cache_clear()
+
+    def _guard(self, hooks: Iterable[T]) -> Iterator[T]:
+        """
+        Iterate over hooks without copying them.
+
+        Raises:
+            RuntimeError: If hooks are registered or cleared during iteration
+        """
+        version = self._version
+        for hook in hooks:
+            if self._version != version:
+                raise RuntimeError("hooks modified during dispatch")
+            yield hook
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Register several hooks, discarding derived state once at the end.
+
+        Compiled interceptor chains are only invalidated when the outermost block
+        exits, so commands dispatched inside the block may not see the hooks
+        registered in it yet.
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_dirty:
+                self._batch_dirty = False
+                self._invalidate()
 
     def register_interceptor(
-        self, func: InterceptorFunc, prefix: Optional[str] = None
+        self, func: InterceptorFunc, prefix: Optional[str] = None, cache: bool = False
     ) -> InterceptorFunc:
         """
         Register a terminal interceptor hook.
@@ -45,13 +333,23 @@ class HookRegistry:
             func: Function that receives a command string and returns either:
                  - A boolean: True to allow execution, False to block
                  - A string: Modified command to execute instead
+                 Any other result, including str subclasses, is ignored
             prefix: Optional command prefix this hook should apply to
                    If None, hook applies to all commands
+            cache: Whether to remember the hook's result for recently seen commands
+                  instead of calling it again. Only use for pure hooks, whose
+                  result depends on nothing but the command
 
         Returns:
             The original function (for decorator usage)
         """
-        self._interceptors.append((prefix, func))
+        if cache:
+            hook = functools.lru_cache(maxsize=256)(func)
+            self._cached_interceptors.append(hook)
+            self._interceptors.add(func, prefix, hook)
+        else:
+            self._interceptors.add(func, prefix)
+        self._invalidate()
         return func
 
     def register_callback(self, func: CallbackFunc, prefix: Optional[str] = None) -> CallbackFunc:
@@ -67,30 +365,156 @@ class HookRegistry:
         Returns:
             The original function (for decorator usage)
         """
-        self._callbacks.append((prefix, func))
+        self._callbacks.add(func, prefix)
+        self._invalidate()
         return func
 
-    def get_interceptors(self) -> List[Tuple[Optional[str], InterceptorFunc]]:
-        """Get all registered interceptor hooks."""
-        return self._interceptors.copy()
+    def register_stream_callback(
+        self, callback: StreamingCallback, prefix: Optional[str] = None
+    ) -> StreamingCallback:
+        """
+        Register a streaming callback hook.
 
-    def get_callbacks(self) -> List[Tuple[Optional[str], CallbackFunc]]:
-        """Get all registered callback hooks."""
-        return self._callbacks.copy()
+        Args:
+            callback: StreamingCallback instance receiving the command's output
+            prefix: Optional command prefix this hook should apply to
+                   If None, hook applies to all commands
+
+        Returns:
+            The original callback
+        """
+        self._stream_callbacks.add(callback, prefix)
+        self._invalidate()
+        return callback
+
+    def get_interceptors(self) -> Tuple[Tuple[Optional[str], InterceptorFunc], ...]:
+        """Get all registered interceptor hooks as an immutable snapshot."""
+        return self._interceptors.snapshot()
+
+    def get_callbacks(self) -> Tuple[Tuple[Optional[str], CallbackFunc], ...]:
+        """Get all registered callback hooks as an immutable snapshot."""
+        return self._callbacks.snapshot()
+
+    def get_stream_callbacks(self) -> Tuple[Tuple[Optional[str], StreamingCallback], ...]:
+        """Get all registered streaming callback hooks as an immutable snapshot."""
+        return self._stream_callbacks.snapshot()
+
+    def has_hooks(self) -> bool:
+        """Return whether any hooks of any type are registered."""
+        return bool(
+            self._interceptors.entries or self._callbacks.entries or self._stream_callbacks.entries
+        )
+
+    def iter_interceptors(self) -> Iterator[Tuple[Optional[str], InterceptorFunc]]:
+        """
+        Iterate all registered interceptor hooks without taking a snapshot.
+
+        Raises:
+            RuntimeError: If hooks are registered or cleared during iteration
+        """
+        return self._guard(self._interceptors.entries)
+
+    def iter_callbacks(self) -> Iterator[Tuple[Optional[str], CallbackFunc]]:
+        """
+        Iterate all registered callback hooks without taking a snapshot.
+
+        Raises:
+            RuntimeError: If hooks are registered or cleared during iteration
+        """
+        return self._guard(self._callbacks.entries)
+
+    def iter_matching_interceptors(self, command: str) -> Iterator[InterceptorFunc]:
+        """
+        Iterate the interceptor hooks that apply to a command, in registration order.
+
+        Raises:
+            RuntimeError: If hooks are registered or cleared during iteration
+        """
+        return self._guard(self._interceptors.iter_matching(command))
+
+    def interceptor_chain(self, command: str) -> InterceptorChainFunc:
+        """
+        Get a function that runs the interceptors applying to a command.
+
+        The function takes the command and returns the command to execute, or
+        None if an interceptor blocked it. Functions are compiled once per set of
+        matching interceptors and reused until the registry changes.
+        """
+        return self._command_hooks(command)[0]
+
+    def _resolve(
+        self, command: str
+    ) -> Tuple[InterceptorChainFunc, Tuple[CallbackFunc, ...], Tuple[StreamingCallback, ...]]:
+        """Find the interceptor chain, callbacks and streaming callbacks matching a command."""
+        hooks = tuple(self._interceptors.iter_matching(command))
+        key = tuple(map(id, hooks))
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = self._chains[key] = _compile_interceptor_chain(hooks)
+        return (
+            chain,
+            tuple(self._callbacks.iter_matching(command)),
+            tuple(self._stream_callbacks.iter_matching(command)),
+        )
+
+    def iter_matching_callbacks(self, command: str) -> Iterator[CallbackFunc]:
+        """
+        Iterate the callback hooks that apply to a command, in registration order.
+
+        The hooks are those matching when iteration starts. Hooks registered or
+        cleared meanwhile, for example by one of these hooks, apply from the next
+        command onwards.
+        """
+        return iter(self._command_hooks(command)[1])
+
+    def iter_matching_stream_callbacks(self, command: str) -> Iterator[StreamingCallback]:
+        """
+        Iterate the streaming callback hooks that apply to a command, in registration order.
+
+        The hooks are those matching when iteration starts. Hooks registered or
+        cleared meanwhile, for example by one of these hooks, apply from the next
+        command onwards.
+        """
+        return iter(self._command_hooks(command)[2])
+
+    def is_cached(self, func: InterceptorFunc) -> bool:
+        """Return whether an interceptor is registered with cache=True."""
+        return any(hook.__wrapped__ is func for hook in self._cached_interceptors)
+
+    def clear_caches(self) -> None:
+        """Forget the results remembered by interceptors registered with cache=True."""
+        for hook in self._cached_interceptors:
+            hook.cache_clear()
 
     def clear(self) -> None:
         """Clear all registered hooks."""
         self._interceptors.clear()
         self._callbacks.clear()
+        self._stream_callbacks.clear()
+        self._cached_interceptors.clear()
+        self._invalidate()
 
 
 # global registry instance
 registry = HookRegistry()
 
+# (prefix, hook) pairs of each hook type, as returned by the registry's getters
+_RegisteredHooks = Tuple[
+    Tuple[Tuple[Optional[str], InterceptorFunc], ...],
+    Tuple[Tuple[Optional[str], CallbackFunc], ...],
+    Tuple[Tuple[Optional[str], StreamingCallback], ...],
+]
+
+# sys.path entries added for hook directories, and for each loaded hook file its
+# modification time and size along with the hooks it registered and the ids of
+# its interceptors registered with cache=True
+_sys_path_added: Set[str] = set()
+_hook_module_cache: Dict[str, Tuple[Tuple[int, int], _RegisteredHooks, FrozenSet[int]]] = {}
+
 
 # decorator functions
 def terminal_interceptor(
-    prefix: Optional[str] = None,
+    prefix: Optional[str] = None, cache: bool = False
 ) -> Callable[[InterceptorFunc], InterceptorFunc]:
     """
     Decorator to register a terminal interceptor hook.
@@ -98,6 +522,8 @@ def terminal_interceptor(
     Args:
         prefix: Optional command prefix this hook should apply to
                If None, hook applies to all commands
+        cache: Whether to remember the hook's result for recently seen commands.
+              Only use for pure hooks, see HookRegistry.register_interceptor
 
     Returns:
         Decorator function
@@ -111,7 +537,7 @@ def terminal_interceptor(
     """
 
     def decorator(func: InterceptorFunc) -> InterceptorFunc:
-        return registry.register_interceptor(func, prefix)
+        return registry.register_interceptor(func, prefix, cache)
 
     return decorator
 
@@ -143,10 +569,45 @@ def terminal_callback(
     return decorator
 
 
+def terminal_stream_callback(
+    prefix: Optional[str] = None,
+) -> Callable[[Type[S]], Type[S]]:
+    """
+    Class decorator to register a streaming callback hook.
+
+    The decorated StreamingCallback subclass is instantiated with no arguments
+    and the instance is registered.
+
+    Args:
+        prefix: Optional command prefix this hook should apply to
+               If None, hook applies to all commands
+
+    Returns:
+        Decorator function
+
+    Example:
+        @terminal_stream_callback(prefix="tail")
+        class CountErrors(StreamingCallback):
+            def on_chunk(self, command: str, stream: str, data: bytes) -> None:
+                if b"ERROR" in data:
+                    print("error seen", file=sys.stderr)
+    """
+
+    def decorator(cls: Type[S]) -> Type[S]:
+        registry.register_stream_callback(cls(), prefix)
+        return cls
+
+    return decorator
+
+
 def load_hooks_from_directory(directory: Union[str, Path]) -> Dict[str, int]:
     """
     Load hooks from Python files in the specified directory.
 
+    Files that were already loaded and have not been modified since are not
+    executed again. Their hooks are only registered again if they were removed
+    from the registry, for example by registry.clear().
+
     Args:
         directory: Path to directory containing hook files
 
@@ -163,33 +624,97 @@ def load_hooks_from_directory(directory: Union[str, Path]) -> Dict[str, int]:
 
     # add hook directory to path
     parent_dir = str(directory_path.parent.absolute())
-    if parent_dir not in sys.path:
+    if parent_dir not in _sys_path_added:
         sys.path.insert(0, parent_dir)
+        _sys_path_added.add(parent_dir)
 
-    hook_counts: Dict[str, int] = {"interceptors": 0, "callbacks": 0}
+    hook_counts: Dict[str, int] = {"interceptors": 0, "callbacks": 0, "stream_callbacks": 0}
 
     # track current hook counts to determine how many were added
     initial_interceptors = len(registry.get_interceptors())
     initial_callbacks = len(registry.get_callbacks())
+    initial_stream_callbacks = len(registry.get_stream_callbacks())
 
     # import all Python files in the directory
-    for file in directory_path.glob("*.py"):
-        spec = importlib.util.spec_from_file_location(file.stem, file)
-        if spec and spec.loader:
-            try:
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-            except Exception as e:
-                print(f"Error loading hook file {file.name}: {e}", file=sys.stderr)
+    try:
+        entries = os.scandir(directory_path.absolute())
+    except NotADirectoryError:
+        # a file in place of the directory holds no hooks
+        return hook_counts
+    with entries:
+        for entry in entries:
+            if not entry.name.endswith(".py") or not entry.is_file():
+                continue
+
+            # the size catches rewrites within the filesystem's timestamp granularity;
+            # files that failed to load are also recorded, so they are only retried
+            # once modified
+            stat = entry.stat()
+            key = (stat.st_mtime_ns, stat.st_size)
+            cached = _hook_module_cache.get(entry.path)
+            if cached is not None and cached[0] == key:
+                _restore_hooks(cached[1], cached[2])
                 continue
 
+            before = _registered_hooks()
+            module_name = _hook_module_name(entry.path)
+            spec = importlib.util.spec_from_file_location(module_name, entry.path)
+            if spec and spec.loader:
+                # registered before executing, as the import system does, so code
+                # in the file that looks its module up (dataclasses, pickle) finds it
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[module_name] = module
+                try:
+                    with registry.batch():
+                        spec.loader.exec_module(module)
+                except Exception as e:
+                    del sys.modules[module_name]
+                    print(f"Error loading hook file {entry.name}: {e}", file=sys.stderr)
+
+            after = _registered_hooks()
+            added = (
+                after[0][len(before[0]) :],
+                after[1][len(before[1]) :],
+                after[2][len(before[2]) :],
+            )
+            cached_ids = frozenset(id(func) for _, func in added[0] if registry.is_cached(func))
+            _hook_module_cache[entry.path] = (key, added, cached_ids)
+
     # calculate how many hooks were added
     hook_counts["interceptors"] = len(registry.get_interceptors()) - initial_interceptors
     hook_counts["callbacks"] = len(registry.get_callbacks()) - initial_callbacks
+    hook_counts["stream_callbacks"] = (
+        len(registry.get_stream_callbacks()) - initial_stream_callbacks
+    )
 
     return hook_counts
 
 
+def _hook_module_name(path: str) -> str:
+    """Name a hook file's module after its path, so files in different directories do not clash."""
+    return f"_te_hooks_{zlib.crc32(os.fsencode(path)):08x}"
+
+
+def _registered_hooks() -> _RegisteredHooks:
+    """Snapshot the hooks of every type in the global registry."""
+    return registry.get_interceptors(), registry.get_callbacks(), registry.get_stream_callbacks()
+
+
+def _restore_hooks(hooks: _RegisteredHooks, cached_ids: FrozenSet[int]) -> None:
+    """Register again any of a hook file's hooks that are no longer in the registry."""
+    present = {id(hook) for snapshot in _registered_hooks() for _, hook in snapshot}
+    interceptors, callbacks, stream_callbacks = hooks
+    for prefix, interceptor in interceptors:
+        if id(interceptor) not in present:
+            registry.register_interceptor(interceptor, prefix, cache=id(interceptor) in cached_ids)
+    for prefix, callback in callbacks:
+        if id(callback) not in present:
+            registry.register_callback(callback, prefix)
+    for prefix, stream_callback in stream_callbacks:
+        if id(stream_callback) not in present:
+            registry.register_stream_callback(stream_callback, prefix)
+
+
 def execute_command(
     command: str, capture_output: bool = False
 ) -> Tuple[int, Optional[str], Optional[str]]:
@@ -204,27 +729,33 @@ def execute_command(
         Tuple of (return_code, stdout, stderr)
         stdout and stderr are None if capture_output is False
     """
-    # use different shell on Windows vs Unix-like systems
-    shell = True
-
-    if platform.system() == "Windows":
-        # use cmd.exe on Windows
-        process_args = ["cmd.exe", "/c", command]
-        shell = True
-    else:
-        # use system shell on Unix-like systems
-        shell_path = os.environ.get("SHELL", "/bin/sh")
-        process_args = [shell_path, "-c", command]
-        shell = False
+    # cmd.exe is run through the Windows shell, the system shell directly elsewhere
+    process_args = _shell_args(command)
+    shell = _IS_WINDOWS
 
     try:
+        if not shell and hasattr(os, "posix_spawnp"):
+            # simple commands are spawned directly, saving the shell's own startup
+            direct_args = _direct_args(command)
+            if direct_args is not None:
+                direct_result = _spawn_direct(direct_args, capture_output)
+                if direct_result is not None:
+                    return direct_result
+            return _posix_spawn_command(process_args, capture_output)
         if capture_output:
             result = subprocess.run(
-                process_args, shell=shell, check=False, text=True, capture_output=True
+                process_args,
+                shell=shell,
+                check=False,
+                text=True,
+                capture_output=True,
+                close_fds=_CLOSE_FDS,
             )
             return result.returncode, result.stdout, result.stderr
         else:
-            result = subprocess.run(process_args, shell=shell, check=False, text=True)
+            result = subprocess.run(
+                process_args, shell=shell, check=False, text=True, close_fds=_CLOSE_FDS
+            )
             return result.returncode, None, None
     except Exception as e:
         error_message = str(e)
@@ -232,56 +763,997 @@ def execute_command(
         return 1, None, error_message
 
 
-def process_command(
+def _shell_args(command: str) -> Tuple[str, str, str]:
+    """Return the arguments that run a command in the platform's shell."""
+    if _IS_WINDOWS:
+        # use cmd.exe on Windows
+        return ("cmd.exe", "/c", command)
+    # use system shell on Unix-like systems
+    return (_DEFAULT_SHELL, "-c", command)
+
+
+# characters that give a command meaning only the shell understands: quoting,
+# expansion, redirection, pipelines, command lists and job control
+_SHELL_METACHARACTERS = frozenset("|&;<>()$`\\\"'*?[]{}~#=%!\n\r")
+
+# builtins and keywords, which the shell runs itself instead of an executable
+_SHELL_BUILTINS = frozenset(
+    {
+        ".", ":", "alias", "bg", "bind", "break", "builtin", "caller", "case", "cd",
+        "command", "compgen", "complete", "continue", "coproc", "declare", "dirs",
+        "disown", "do", "done", "elif", "else", "enable", "esac", "eval", "exec",
+        "exit", "export", "fc", "fg", "fi", "for", "function", "getopts", "hash",
+        "history", "if", "in", "jobs", "let", "local", "logout", "mapfile", "popd",
+        "pushd", "read", "readarray", "readonly", "return", "select", "set", "shift",
+        "shopt", "source", "suspend", "then", "time", "times", "trap", "type",
+        "typeset", "ulimit", "umask", "unalias", "unset", "until", "wait", "while",
+    }
+)  # fmt: skip
+
+# the shell's default field separators; other whitespace is part of a word
+_WORD_SEPARATORS = re.compile("[ \t]+")
+
+
+def _direct_args(command: str) -> Optional[Tuple[str, ...]]:
+    """
+    Split a command that does not need a shell into the arguments to spawn it.
+
+    Without any metacharacters, the shell only splits words on spaces and tabs,
+    so running the arguments directly behaves the same.
+
+    Returns:
+        The arguments, or None if the command has to be run by the shell
+    """
+    if not _SHELL_METACHARACTERS.isdisjoint(command):
+        return None
+    args = tuple(word for word in _WORD_SEPARATORS.split(command) if word)
+    if not args or args[0] in _SHELL_BUILTINS:
+        return None
+    return args
+
+
+def _spawn_direct(
+    args: Tuple[str, ...], capture_output: bool
+) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Spawn a simple command without a shell.
+
+    Returns:
+        The command's result, or None if the program has to be run by the shell,
+        such as an executable script without a shebang line
+    """
+    try:
+        return _posix_spawn_command(args, capture_output)
+    except FileNotFoundError:
+        return _spawn_failure(args[0], "not found", 127, capture_output)
+    except PermissionError:
+        return _spawn_failure(args[0], "Permission denied", 126, capture_output)
+    except OSError as e:
+        if e.errno == errno.ENOEXEC:
+            return None
+        raise
+
+
+def _spawn_failure(
+    program: str, reason: str, return_code: int, capture_output: bool
+) -> Tuple[int, Optional[str], Optional[str]]:
+    """Report a program that could not be started the way the shell does."""
+    message = f"{program}: {reason}"
+    if capture_output:
+        return return_code, "", message + "\n"
+    print(message, file=sys.stderr)
+    return return_code, None, None
+
+
+# signals Python ignores, reset to their default action in spawned commands as
+# subprocess does with restore_signals, so e.g. `yes | head -1` ends quietly
+_RESTORED_SIGNALS = tuple(
+    getattr(signal, name) for name in ("SIGPIPE", "SIGXFZ", "SIGXFSZ") if hasattr(signal, name)
+)
+
+
+def _posix_spawn_command(
+    process_args: Tuple[str, ...], capture_output: bool
+) -> Tuple[int, Optional[str], Optional[str]]:
+    """
+    Run a command with os.posix_spawnp and wait for it to finish.
+
+    posix_spawn avoids duplicating the parent's page tables the way fork does,
+    which matters once many hook modules have been loaded into the process.
+    """
+    file_actions = []
+    streams: Dict[int, str] = {}
+    child_fds: List[int] = []
+    if capture_output:
+        for stream, target_fd in (("stdout", 1), ("stderr", 2)):
+            read_fd, write_fd = os.pipe()
+            streams[read_fd] = stream
+            child_fds.append(write_fd)
+            file_actions.append((os.POSIX_SPAWN_DUP2, write_fd, target_fd))
+
+    try:
+        pid = os.posix_spawnp(
+            process_args[0],
+            process_args,
+            os.environ,
+            file_actions=file_actions,
+            setsigdef=_RESTORED_SIGNALS,
+        )
+    except Exception:
+        for fd in streams:
+            os.close(fd)
+        raise
+    finally:
+        # the child holds its own copies of the write ends
+        for fd in child_fds:
+            os.close(fd)
+
+    output: Dict[str, List[bytes]] = {"stdout": [], "stderr": []}
+    try:
+        for stream, data in _iter_pipes(streams):
+            output[stream].append(data)
+    finally:
+        for fd in streams:
+            os.close(fd)
+        _, status = os.waitpid(pid, 0)
+
+    return_code = _return_code(status)
+    if not capture_output:
+        return return_code, None, None
+    return (
+        return_code,
+        _decode_output(b"".join(output["stdout"])),
+        _decode_output(b"".join(output["stderr"])),
+    )
+
+
+def _return_code(wait_status: int) -> int:
+    """Convert a status from os.waitpid into a return code."""
+    # match subprocess: negative signal number if the process was killed
+    if os.WIFSIGNALED(wait_status):
+        return -os.WTERMSIG(wait_status)
+    return os.WEXITSTATUS(wait_status)
+
+
+# shells known to understand the POSIX syntax generated for PersistentShell and
+# batched commands
+_POSIX_SHELLS = frozenset({"sh", "ash", "bash", "dash", "ksh", "zsh"})
+
+
+def _posix_shell_path() -> str:
+    """Return $SHELL if it is a POSIX shell, and /bin/sh otherwise."""
+    if os.path.basename(_DEFAULT_SHELL) not in _POSIX_SHELLS:
+        return "/bin/sh"
+    return _DEFAULT_SHELL
+
+
+# run before any commands: zsh only lets `command` run builtins such as eval
+# with POSIX_BUILTINS set
+_ZSH_POSIX_BUILTINS = '[ -n "$ZSH_VERSION" ] && setopt POSIX_BUILTINS'
+
+# how long an interrupted command in a PersistentShell may take to finish before
+# the shell is killed
+_RECOVER_TIMEOUT = 0.5
+
+# fds of the status, stdout and stderr pipes and of the terminal's stdin in a
+# PersistentShell, the status fd also in batch scripts; single digits, since dash
+# only accepts those in redirections
+_SHELL_STATUS_FD = 3
+_SHELL_STDOUT_FD = 4
+_SHELL_STDERR_FD = 5
+_SHELL_STDIN_FD = 6
+
+
+def _move_fd_actions(fds: List[Tuple[int, int]]) -> List[Tuple[int, ...]]:
+    """
+    Build posix_spawn file actions that give the child each fd under a new number.
+
+    The fds are first moved above every number involved, so that no dup2 can
+    overwrite an fd that has yet to be moved.
+
+    Args:
+        fds: (fd, number it should have in the child) pairs
+    """
+    base = max(max(pair) for pair in fds) + 1
+    actions: List[Tuple[int, ...]] = []
+    for offset, (fd, _) in enumerate(fds):
+        actions.append((os.POSIX_SPAWN_DUP2, fd, base + offset))
+    for offset, (_, target) in enumerate(fds):
+        actions.append((os.POSIX_SPAWN_DUP2, base + offset, target))
+        actions.append((os.POSIX_SPAWN_CLOSE, base + offset))
+    return actions
+
+
+class PersistentShell:
+    """
+    A long-lived shell process that commands are executed in one at a time.
+
+    Reusing one shell avoids starting a new shell for every command, and lets
+    shell state such as the working directory and environment variables carry
+    over between commands like in a regular terminal. Each command is passed to
+    the shell's eval builtin, and its exit status is written back through a
+    dedicated pipe. Only POSIX shells are supported.
+
+    If waiting for a command is interrupted, for example by Ctrl+C, the shell is
+    given a moment to report the command's status and is killed otherwise, so a
+    later command can never read an earlier command's status or output.
+    """
+
+    def __init__(self, shell_path: Optional[str] = None) -> None:
+        """
+        Initialize the shell. The process is started on the first command.
+
+        Args:
+            shell_path: Shell to run. Defaults to $SHELL if it is a POSIX shell
+                       and /bin/sh otherwise
+        """
+        self.shell_path = shell_path if shell_path is not None else _posix_shell_path()
+        self._pid = -1
+        # set once the shell process has exited and been reaped
+        self._return_code: Optional[int] = None
+        # writes commands to the shell's stdin
+        self._commands: Optional[IO[str]] = None
+        # (our read end, the shell's fd) of the status, stdout and stderr pipes
+        self._status: Tuple[int, int] = (-1, -1)
+        self._stdout: Tuple[int, int] = (-1, -1)
+        self._stderr: Tuple[int, int] = (-1, -1)
+
+    def _ensure_started(self) -> IO[str]:
+        """Start the shell process if it is not running, and return its command input."""
+        if self._commands is not None and self._wait(block=False) is None:
+            return self._commands
+        self.close()
+
+        command_read, command_write = os.pipe()
+        pipes = [os.pipe() for _ in range(3)]
+        # commands read from the terminal rather than from the pipe feeding the shell
+        try:
+            stdin_fd = os.dup(sys.stdin.fileno())
+        except (AttributeError, OSError, ValueError):
+            stdin_fd = os.open(os.devnull, os.O_RDONLY)
+        # (our fd, the shell's fd) for everything the shell inherits
+        child_fds = [
+            (command_read, 0),
+            (pipes[0][1], _SHELL_STATUS_FD),
+            (pipes[1][1], _SHELL_STDOUT_FD),
+            (pipes[2][1], _SHELL_STDERR_FD),
+            (stdin_fd, _SHELL_STDIN_FD),
+        ]
+
+        try:
+            self._pid = os.posix_spawnp(
+                self.shell_path,
+                [self.shell_path, "-s"],
+                os.environ,
+                file_actions=_move_fd_actions(child_fds),
+                setsigdef=_RESTORED_SIGNALS,
+            )
+        except Exception:
+            for read_fd, _ in pipes:
+                os.close(read_fd)
+            os.close(command_write)
+            raise
+        finally:
+            # the shell holds its own copies of these
+            for fd, _ in child_fds:
+                os.close(fd)
+
+        for read_fd, _ in pipes[1:]:
+            os.set_blocking(read_fd, False)
+        self._status, self._stdout, self._stderr = (
+            (read_fd, shell_fd) for (read_fd, _), (_, shell_fd) in zip(pipes, child_fds[1:4])
+        )
+        self._commands = os.fdopen(command_write, "w")
+        # Ctrl+C at the terminal signals the whole process group, which the shell
+        # must survive to keep its state; trapped signals are reset in the
+        # commands it runs, so those can still be interrupted
+        self._commands.write(f"{_ZSH_POSIX_BUILTINS}\ntrap : INT QUIT\n")
+        return self._commands
+
+    def _send(self, command: str, redirects: str) -> None:
+        """Start the shell if needed and pass it a command followed by a status report."""
+        commands = self._ensure_started()
+        # `command` stops a syntax error in eval, a special builtin, from exiting the shell
+        commands.write(
+            f"command eval {shlex.quote(command)} <&{_SHELL_STDIN_FD} {redirects}\n"
+            f"printf '%d\\n' \"$?\" >&{self._status[1]}\n"
+        )
+        commands.flush()
+
+    def _wait(self, block: bool = True) -> Optional[int]:
+        """
+        Reap the shell process if it has exited.
+
+        Returns:
+            The shell's return code, or None if it is still running
+        """
+        if self._return_code is None and self._pid >= 0:
+            pid, status = os.waitpid(self._pid, 0 if block else os.WNOHANG)
+            if pid:
+                self._return_code = _return_code(status)
+        return self._return_code
+
+    def _exited(self) -> int:
+        """Handle the shell exiting during a command, e.g. via the exit builtin."""
+        return_code = self._wait()
+        self.close()
+        return return_code if return_code is not None else 1
+
+    def run(
+        self, command: str, capture_output: bool = False
+    ) -> Tuple[int, Optional[str], Optional[str]]:
+        """
+        Execute a command in the shell, starting or restarting it as needed.
+
+        Args:
+            command: The command to execute
+            capture_output: Whether to capture and return stdout/stderr
+
+        Returns:
+            Tuple of (return_code, stdout, stderr)
+            stdout and stderr are None if capture_output is False
+        """
+        try:
+            if capture_output:
+                output: Dict[str, List[bytes]] = {"stdout": [], "stderr": []}
+                return_code = consume_output(
+                    self.iter_run(command), lambda stream, data: output[stream].append(data)
+                )
+                return (
+                    return_code,
+                    _decode_output(b"".join(output["stdout"])),
+                    _decode_output(b"".join(output["stderr"])),
+                )
+
+            status = b""
+            try:
+                self._send(command, "")
+                while not status.endswith(b"\n"):
+                    data = os.read(self._status[0], 64)
+                    if not data:
+                        return self._exited(), None, None
+                    status += data
+            except BaseException:
+                self._recover(status)
+                raise
+            return int(status), None, None
+        except Exception as e:
+            error_message = str(e)
+            print(f"Error executing command: {error_message}", file=sys.stderr)
+            return 1, None, error_message
+
+    def iter_run(self, command: str) -> Generator[Tuple[str, bytes], None, int]:
+        """
+        Execute a command in the shell, yielding its output as it is produced.
+
+        Yields:
+            (stream, data) tuples, where stream is "stdout" or "stderr"
+
+        Returns:
+            The command's return code, as the generator's return value
+        """
+        status = b""
+        try:
+            self._ensure_started()
+            self._send(command, f">&{self._stdout[1]} 2>&{self._stderr[1]}")
+            streams = {self._stdout[0]: "stdout", self._stderr[0]: "stderr"}
+            status_fd = self._status[0]
+
+            while not status.endswith(b"\n"):
+                ready, _, _ = select.select([*streams, status_fd], [], [])
+                for fd in ready:
+                    if fd == status_fd:
+                        data = os.read(fd, 64)
+                        if not data:
+                            yield from _drain_nonblocking(streams)
+                            return self._exited()
+                        status += data
+                    else:
+                        yield from _drain_nonblocking({fd: streams[fd]})
+
+            # the command has finished, so anything it wrote is already in the pipes
+            yield from _drain_nonblocking(streams)
+        except BaseException:
+            # also reached when the consumer stops iterating early
+            self._recover(status)
+            raise
+        return int(status)
+
+    def _recover(self, status: bytes) -> None:
+        """
+        Resynchronize with the shell after waiting for a command was interrupted.
+
+        Reads and discards the rest of the command's status and output, waiting
+        at most _RECOVER_TIMEOUT for the command to finish; typically it was
+        interrupted by the same Ctrl+C. Kills the shell if it does not finish.
+
+        Args:
+            status: The part of the command's status line already read
+        """
+        if self._commands is None:
+            return
+        fds = [fd for fd, _ in (self._status, self._stdout, self._stderr)]
+        deadline = time.monotonic() + _RECOVER_TIMEOUT
+        try:
+            while True:
+                # once the status is in, the command's output is too
+                timeout = 0.0 if status.endswith(b"\n") else deadline - time.monotonic()
+                ready, _, _ = select.select(fds, [], [], max(timeout, 0.0))
+                if not ready:
+                    break
+                for fd in ready:
+                    data = os.read(fd, _CHUNK_SIZE)
+                    if fd == fds[0]:
+                        if not data:
+                            # the shell exited, so there is nothing left to read
+                            self._exited()
+                            return
+                        status += data
+                    elif not data:
+                        fds.remove(fd)
+        except BaseException:
+            self._kill()
+            raise
+        if not status.endswith(b"\n"):
+            self._kill()
+
+    def _kill(self) -> None:
+        """Kill the shell process, discarding its state."""
+        if self._pid >= 0 and self._return_code is None:
+            os.kill(self._pid, signal.SIGKILL)
+        self.close()
+
+    def close(self) -> None:
+        """Stop the shell process if it is running."""
+        if self._commands is not None:
+            try:
+                self._commands.close()
+            except OSError:
+                pass
+            self._commands = None
+        if self._pid >= 0:
+            self._wait()
+            self._pid = -1
+            self._return_code = None
+        for read_fd, _ in (self._status, self._stdout, self._stderr):
+            if read_fd >= 0:
+                os.close(read_fd)
+        self._status = self._stdout = self._stderr = (-1, -1)
+
+
+async def execute_command_async(
     command: str, capture_output: bool = False
+) -> Tuple[int, Optional[str], Optional[str]]:
+    """
+    Asynchronous version of execute_command.
+
+    Args:
+        command: The command to execute
+        capture_output: Whether to capture and return stdout/stderr
+
+    Returns:
+        Tuple of (return_code, stdout, stderr)
+        stdout and stderr are None if capture_output is False
+    """
+    process_args = _shell_args(command)
+    pipe = asyncio.subprocess.PIPE if capture_output else None
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *process_args, stdout=pipe, stderr=pipe, close_fds=_CLOSE_FDS
+        )
+        stdout, stderr = await process.communicate()
+    except Exception as e:
+        error_message = str(e)
+        print(f"Error executing command: {error_message}", file=sys.stderr)
+        return 1, None, error_message
+
+    assert process.returncode is not None
+    if capture_output:
+        return process.returncode, _decode_output(stdout), _decode_output(stderr)
+    return process.returncode, None, None
+
+
+def _decode_output(data: bytes) -> str:
+    """Decode subprocess output the same way subprocess.run(text=True) does."""
+    text = data.decode(locale.getpreferredencoding(False))
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def iterable_execute(command: str) -> Generator[Tuple[str, bytes], None, int]:
+    """
+    Execute a shell command, yielding its output as it is produced.
+
+    Unlike execute_command with capture_output, the output is never buffered in
+    full, so long-running or very chatty commands can be followed as they run.
+
+    Args:
+        command: The command to execute
+
+    Yields:
+        (stream, data) tuples, where stream is "stdout" or "stderr"
+
+    Returns:
+        The command's return code, as the generator's return value
+    """
+    if _IS_WINDOWS:
+        # select() only supports sockets on Windows, so fall back to buffering
+        process = subprocess.Popen(
+            _shell_args(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        stdout, stderr = process.communicate()
+        if stdout:
+            yield "stdout", stdout
+        if stderr:
+            yield "stderr", stderr
+        return process.returncode
+
+    process = subprocess.Popen(
+        _shell_args(command),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+        close_fds=_CLOSE_FDS,
+    )
+    assert process.stdout is not None and process.stderr is not None
+    with process:
+        yield from _iter_pipes(
+            {process.stdout.fileno(): "stdout", process.stderr.fileno(): "stderr"}
+        )
+    return process.returncode
+
+
+def _iter_pipes(streams: Dict[int, str]) -> Iterator[Tuple[str, bytes]]:
+    """Yield (stream, data) chunks from blocking pipes as they arrive, until all reach EOF."""
+    streams = dict(streams)
+    while streams:
+        ready, _, _ = select.select(list(streams), [], [])
+        for fd in ready:
+            data = os.read(fd, _CHUNK_SIZE)
+            if data:
+                yield streams[fd], data
+            else:
+                del streams[fd]
+
+
+def _drain_nonblocking(streams: Dict[int, str]) -> Iterator[Tuple[str, bytes]]:
+    """Yield (stream, data) chunks from non-blocking pipes until none are left to read."""
+    for fd, stream in streams.items():
+        while True:
+            try:
+                data = os.read(fd, _CHUNK_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            yield stream, data
+
+
+def consume_output(
+    chunks: Generator[Tuple[str, bytes], None, int], on_chunk: Callable[[str, bytes], None]
+) -> int:
+    """
+    Feed the output of iterable_execute, or a generator like it, to a function.
+
+    Args:
+        chunks: Generator yielding (stream, data) tuples and returning a return code
+        on_chunk: Function called as on_chunk(stream, data) for each chunk
+
+    Returns:
+        The return code returned by the generator
+    """
+    while True:
+        try:
+            stream, data = next(chunks)
+        except StopIteration as stop:
+            return_code: int = stop.value
+            return return_code
+        on_chunk(stream, data)
+
+
+def process_command(
+    command: str,
+    capture_output: bool = False,
+    execute: Optional[ExecuteFunc] = None,
+    stream_execute: Optional[StreamExecuteFunc] = None,
 ) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
     """
     Process a command through all registered interceptors and execute if allowed.
 
+    If any streaming callbacks apply to the command, its output is streamed to
+    them as it is produced, and is only buffered if capture_output is set.
+
     Args:
         command: The command to execute
         capture_output: Whether to capture and return stdout/stderr
+        execute: Optional function used to run the command, called as
+                execute(command, capture_output). Defaults to execute_command
+        stream_execute: Optional function used to run the command when streaming,
+                       called as stream_execute(command). Defaults to iterable_execute
 
     Returns:
         If command is executed: Tuple of (return_code, stdout, stderr)
         If command is blocked: None
     """
-    # run through interceptors and get final command
-    modified_command = command
-    should_execute = True
+    if not registry.has_hooks():
+        # nothing can rewrite, block or observe the command
+        if execute is None:
+            execute = execute_command
+        return execute(command, capture_output)
 
-    for prefix, interceptor in registry.get_interceptors():
-        if prefix is None or command.startswith(prefix):
-            try:
-                result = interceptor(modified_command)
-                if isinstance(result, bool):
-                    # bool result determines whether to continue
-                    should_execute = result
-                    if not should_execute:
-                        break
-                elif isinstance(result, str):
-                    # string result replaces the command
-                    modified_command = result
-            except Exception as e:
-                print(f"Error in interceptor {interceptor.__name__}: {e}", file=sys.stderr)
-
-    # execute the command if allowed
-    if should_execute:
-        return_code, stdout, stderr = execute_command(modified_command, capture_output)
+    command = _intern_command(command)
 
-        # run callbacks
-        for prefix, callback in registry.get_callbacks():
-            if prefix is None or command.startswith(prefix):
-                try:
-                    callback(command, return_code, stdout, stderr)
-                except Exception as e:
-                    print(f"Error in callback {callback.__name__}: {e}", file=sys.stderr)
+    # run through interceptors and get final command
+    modified_command = _run_interceptors(command)
 
+    # execute the command if allowed
+    if modified_command is not None:
+        stream_callbacks = tuple(registry.iter_matching_stream_callbacks(command))
+        if stream_callbacks:
+            if stream_execute is None:
+                stream_execute = iterable_execute
+            return_code, stdout, stderr = _execute_streaming(
+                command, modified_command, capture_output, stream_callbacks, stream_execute
+            )
+        else:
+            if execute is None:
+                execute = execute_command
+            return_code, stdout, stderr = execute(modified_command, capture_output)
+        _run_callbacks(command, return_code, stdout, stderr)
         return return_code, stdout, stderr
 
     return None
 
 
+def _execute_streaming(
+    command: str,
+    modified_command: str,
+    capture_output: bool,
+    stream_callbacks: Tuple[StreamingCallback, ...],
+    stream_execute: StreamExecuteFunc,
+) -> Tuple[int, Optional[str], Optional[str]]:
+    """Execute a command, passing its output to streaming callbacks as it is produced."""
+    buffers = {"stdout": io.BytesIO(), "stderr": io.BytesIO()} if capture_output else None
+
+    def on_chunk(stream: str, data: bytes) -> None:
+        for callback in stream_callbacks:
+            _safe_call(callback.on_chunk, (command, stream, data), "callback")
+        if buffers is not None:
+            buffers[stream].write(data)
+        else:
+            # nothing is captured, so pass the output through to the terminal
+            _write_output(sys.stdout if stream == "stdout" else sys.stderr, data)
+
+    try:
+        return_code = consume_output(stream_execute(modified_command), on_chunk)
+    except Exception as e:
+        error_message = str(e)
+        print(f"Error executing command: {error_message}", file=sys.stderr)
+        return 1, None, error_message
+
+    for callback in stream_callbacks:
+        _safe_call(callback.on_finish, (command, return_code), "callback")
+
+    if buffers is None:
+        return return_code, None, None
+    return (
+        return_code,
+        _decode_output(buffers["stdout"].getvalue()),
+        _decode_output(buffers["stderr"].getvalue()),
+    )
+
+
+def _write_output(file: IO[str], data: bytes) -> None:
+    """Write raw command output to a text stream such as sys.stdout."""
+    buffer = getattr(file, "buffer", None)
+    if buffer is None:
+        file.write(data.decode(locale.getpreferredencoding(False), errors="replace"))
+        return
+    file.flush()
+    buffer.write(data)
+    buffer.flush()
+
+
+def process_commands(
+    commands: List[str], capture_output: bool = False
+) -> List[Optional[Tuple[int, Optional[str], Optional[str]]]]:
+    """
+    Process several commands through the hooks and execute them in a single shell.
+
+    Every command goes through its interceptors first. The commands that are
+    allowed then run one after another as a single shell script, so they share
+    one shell startup as well as shell state, and their callbacks run afterwards
+    in order. A command that exits the shell ends the batch.
+
+    Streaming callbacks are not run for batched commands, since their output
+    is not split per command until the batch has finished; a warning is
+    printed if any apply. Use process_command for commands that need them.
+
+    Args:
+        commands: The commands to execute
+        capture_output: Whether to capture and return stdout/stderr
+
+    Returns:
+        One entry per command reached: (return_code, stdout, stderr) if it was
+        executed, None if it was blocked. If a command exited the shell, the list
+        ends with it, so it is shorter than commands
+    """
+    results: List[Optional[Tuple[int, Optional[str], Optional[str]]]] = [None] * len(commands)
+    allowed = []
+    for index, command in enumerate(commands):
+        modified_command = _run_interceptors(_intern_command(command))
+        if modified_command is not None:
+            allowed.append((index, modified_command))
+    if not allowed:
+        return results
+    if any(next(registry.iter_matching_stream_callbacks(commands[i]), None) for i, _ in allowed):
+        print("Warning: streaming callbacks are not run for batched commands", file=sys.stderr)
+
+    batch_results = _execute_batch([command for _, command in allowed], capture_output)
+    for (index, _), result in zip(allowed, batch_results):
+        results[index] = result
+        _run_callbacks(commands[index], *result)
+    if len(batch_results) < len(allowed):
+        # the shell exited before reaching the remaining commands
+        del results[allowed[len(batch_results) - 1][0] + 1 :]
+    return results
+
+
+def _execute_batch(
+    commands: List[str], capture_output: bool
+) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Execute commands as one shell script, returning a result per command that ran.
+
+    Each command's exit status is written to a dedicated pipe, which the commands
+    themselves do not inherit. When capturing, a random separator is also written
+    to stdout and stderr after each command so the captured output can be split
+    per command. Output is read until the shell exits, so background jobs that
+    keep running do not hold up the batch.
+    """
+    if _IS_WINDOWS:
+        return [execute_command(command, capture_output) for command in commands]
+
+    separator = f"___TE_{secrets.token_hex(8)}___"
+    script = [_ZSH_POSIX_BUILTINS]
+    for command in commands:
+        # "command" keeps a syntax error in one command from exiting the shell
+        script.append(f"command eval {shlex.quote(command)} {_SHELL_STATUS_FD}>&-")
+        script.append(f"printf '%d\\n' \"$?\" >&{_SHELL_STATUS_FD}")
+        if capture_output:
+            script.append(f"printf '{separator}'; printf '{separator}' >&2")
+
+    status_r, status_w = os.pipe()
+    outputs: Dict[int, str] = {}
+    # (our fd, the shell's fd) for the pipes the shell writes to
+    child_fds = [(status_w, _SHELL_STATUS_FD)]
+    if capture_output:
+        for stream, target_fd in (("stdout", 1), ("stderr", 2)):
+            read_fd, write_fd = os.pipe()
+            outputs[read_fd] = stream
+            child_fds.append((write_fd, target_fd))
+
+    shell_path = _posix_shell_path()
+    try:
+        pid = os.posix_spawnp(
+            shell_path,
+            [shell_path, "-c", "\n".join(script)],
+            os.environ,
+            file_actions=_move_fd_actions(child_fds),
+            setsigdef=_RESTORED_SIGNALS,
+        )
+    except Exception as e:
+        for fd in (status_r, *outputs):
+            os.close(fd)
+        error_message = str(e)
+        print(f"Error executing command: {error_message}", file=sys.stderr)
+        return [(1, None, error_message)]
+    finally:
+        # the shell holds its own copies of the write ends
+        for fd, _ in child_fds:
+            os.close(fd)
+
+    output: Dict[str, List[bytes]] = {"status": [], "stdout": [], "stderr": []}
+    streams = {status_r: "status", **outputs}
+    try:
+        # only the shell itself holds the status pipe, so it closes when the shell exits
+        while status_r in streams:
+            ready, _, _ = select.select(list(streams), [], [])
+            for fd in ready:
+                data = os.read(fd, _CHUNK_SIZE)
+                if data:
+                    output[streams[fd]].append(data)
+                else:
+                    del streams[fd]
+        # everything the shell wrote is in the pipes now, though background jobs
+        # may still hold them open
+        for fd in outputs:
+            os.set_blocking(fd, False)
+        for stream, data in _drain_nonblocking(outputs):
+            output[stream].append(data)
+    finally:
+        for fd in (status_r, *outputs):
+            os.close(fd)
+        _, wait_status = os.waitpid(pid, 0)
+
+    return_codes = [int(status) for status in b"".join(output["status"]).split()]
+    if len(return_codes) < len(commands):
+        # the next command exited the shell
+        return_codes.append(_return_code(wait_status))
+
+    if not capture_output:
+        return [(return_code, None, None) for return_code in return_codes]
+    stdout = _decode_output(b"".join(output["stdout"])).split(separator)
+    stderr = _decode_output(b"".join(output["stderr"])).split(separator)
+    return list(zip(return_codes, stdout, stderr))
+
+
+async def process_command_async(
+    command: str,
+    capture_output: bool = False,
+    execute: Optional[AsyncExecuteFunc] = None,
+    stream_execute: Optional[StreamExecuteFunc] = None,
+) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Asynchronous version of process_command.
+
+    The command is executed without blocking the event loop, and the matching
+    callbacks are run concurrently in worker threads. If any streaming callbacks
+    apply, the command is streamed to them from a worker thread instead.
+
+    Args:
+        command: The command to execute
+        capture_output: Whether to capture and return stdout/stderr
+        execute: Optional coroutine function used to run the command, called as
+                execute(command, capture_output). Defaults to execute_command_async
+        stream_execute: Optional function used to run the command when streaming,
+                       called as stream_execute(command). Defaults to iterable_execute
+
+    Returns:
+        If command is executed: Tuple of (return_code, stdout, stderr)
+        If command is blocked: None
+    """
+    if execute is None:
+        execute = execute_command_async
+    if not registry.has_hooks():
+        return await execute(command, capture_output)
+
+    command = _intern_command(command)
+    modified_command = _run_interceptors(command)
+    if modified_command is None:
+        return None
+
+    stream_callbacks = tuple(registry.iter_matching_stream_callbacks(command))
+    if stream_callbacks:
+        if stream_execute is None:
+            stream_execute = iterable_execute
+        return_code, stdout, stderr = await asyncio.get_running_loop().run_in_executor(
+            None,
+            _execute_streaming,
+            command,
+            modified_command,
+            capture_output,
+            stream_callbacks,
+            stream_execute,
+        )
+    else:
+        return_code, stdout, stderr = await execute(modified_command, capture_output)
+    await _run_callbacks_async(command, return_code, stdout, stderr)
+    return return_code, stdout, stderr
+
+
+# commands longer than this are not interned, so pathological input is not kept around
+_MAX_INTERNED_COMMAND = 4096
+
+
+def _intern_command(command: str) -> str:
+    """
+    Intern a command string.
+
+    Interactive users repeat the same commands, and an interned command is a
+    single object whose hash is computed once, which speeds up the dict lookups
+    performed on it during dispatch.
+    """
+    return sys.intern(command) if len(command) < _MAX_INTERNED_COMMAND else command
+
+
+def _run_interceptors(command: str) -> Optional[str]:
+    """
+    Run the interceptors that apply to a command.
+
+    Returns:
+        The command to execute, or None if an interceptor blocked it
+    """
+    return registry.interceptor_chain(command)(command)
+
+
+def _compile_interceptor_chain(hooks: Tuple[InterceptorFunc, ...]) -> InterceptorChainFunc:
+    """
+    Generate a function that runs a fixed sequence of interceptors.
+
+    Each interceptor call is unrolled into straight-line code with its own
+    try/except, so running the chain involves no loop over the hooks and no
+    intermediate call per hook.
+    """
+    lines = ["def _chain(command):"]
+    for index, hook in enumerate(hooks):
+        lines += [
+            f"    # hook {index}: {getattr(hook, '__qualname__', type(hook).__name__)!r}",
+            "    try:",
+            f"        result = _h{index}(command)",
+            "    except Exception as error:",
+            f"        _report(_h{index}, 'interceptor', error)",
+            "        result = None",
+            # bool result determines whether to continue, string result replaces the
+            # command; exact type checks, since hooks return plain bool or str values
+            "    result_type = type(result)",
+            "    if result_type is bool:",
+            "        if not result:",
+            "            return None",
+            "    elif result_type is str:",
+            "        command = result",
+        ]
+    lines.append("    return command")
+
+    namespace: Dict[str, Any] = {f"_h{index}": hook for index, hook in enumerate(hooks)}
+    namespace["_report"] = _report_hook_error
+    exec(compile("\n".join(lines), "<interceptor chain>", "exec"), namespace)
+    chain: InterceptorChainFunc = namespace["_chain"]
+    return chain
+
+
+def _safe_call(hook: Callable[..., T], args: Tuple[Any, ...], kind: str) -> Optional[T]:
+    """
+    Call a hook, reporting rather than propagating any exception it raises.
+
+    Args:
+        hook: The hook to call
+        args: Positional arguments for the hook
+        kind: Kind of hook, used in the error message
+
+    Returns:
+        The hook's result, or None if it raised an exception
+    """
+    try:
+        return hook(*args)
+    except Exception as e:
+        _report_hook_error(hook, kind, e)
+        return None
+
+
+def _report_hook_error(hook: Callable[..., Any], kind: str, error: Exception) -> None:
+    """Print an exception raised by a hook to stderr."""
+    # report methods of streaming callbacks by their class
+    name = hook.__qualname__ if hasattr(hook, "__func__") else hook.__name__
+    print(f"Error in {kind} {name}: {error}", file=sys.stderr)
+
+
+def _run_callbacks(
+    command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+) -> None:
+    """Run the callbacks that apply to a command, in registration order."""
+    for callback in registry.iter_matching_callbacks(command):
+        try:
+            callback(command, return_code, stdout, stderr)
+        except Exception as e:
+            _report_hook_error(callback, "callback", e)
+
+
+async def _run_callbacks_async(
+    command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+) -> None:
+    """Run the callbacks that apply to a command concurrently in worker threads."""
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                None, _safe_call, callback, (command, return_code, stdout, stderr), "callback"
+            )
+            for callback in registry.iter_matching_callbacks(command)
+        )
+    )
+
+
 class TerminalSession:
     """
     A simple terminal session that provides an interface for executing commands
@@ -289,8 +1761,13 @@ class TerminalSession:
     handle shell environment details.
     """
 
+    __slots__ = ("_input", "_shell", "prompt", "running")
+
     def __init__(
-        self, prompt: str = "$ ", hooks_directory: Optional[Union[str, Path]] = None
+        self,
+        prompt: str = "$ ",
+        hooks_directory: Optional[Union[str, Path]] = None,
+        input_fn: Optional[Callable[[str], str]] = None,
     ) -> None:
         """
         Initialize a new terminal session.
@@ -298,9 +1775,23 @@ class TerminalSession:
         Args:
             prompt: The prompt to display before each command
             hooks_directory: Optional directory to load hooks from
+            input_fn: Optional function called with the prompt to read each
+                     command, raising EOFError at the end of input. Defaults to
+                     input() when stdin is a terminal, and to reading stdin
+                     directly otherwise
         """
         self.prompt = prompt
         self.running = False
+        # reuse one shell for the whole session where the platform supports it; other
+        # shells' syntax could not be run in a POSIX shell, so they run per command
+        if not _IS_WINDOWS and os.path.basename(_DEFAULT_SHELL) in _POSIX_SHELLS:
+            self._shell: Optional[PersistentShell] = PersistentShell()
+        else:
+            self._shell = None
+        # input() is only worth its readline overhead when a person is typing
+        if input_fn is None:
+            input_fn = input if sys.stdin.isatty() else self._read_line
+        self._input = input_fn
 
         # load hooks if directory provided
         if hooks_directory:
@@ -313,6 +1804,21 @@ class TerminalSession:
             except FileNotFoundError:
                 pass
 
+    @staticmethod
+    def _read_line(prompt: str) -> str:
+        """
+        Prompt for and read the next command from a non-interactive stdin.
+
+        Raises:
+            EOFError: If the input has ended
+        """
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            raise EOFError
+        return line
+
     def start(self) -> None:
         """Start the terminal session."""
         self.running = True
@@ -320,7 +1826,7 @@ class TerminalSession:
 
         while self.running:
             try:
-                command = input(self.prompt).strip()
+                command = self._input(self.prompt).strip()
 
                 if not command:
                     continue
@@ -330,7 +1836,12 @@ class TerminalSession:
                     break
 
                 # process command through hooks and execute
-                result = process_command(command)
+                if self._shell is not None:
+                    result = process_command(
+                        command, execute=self._shell.run, stream_execute=self._shell.iter_run
+                    )
+                else:
+                    result = process_command(command)
                 if result is None:
                     print("Command was blocked by an interceptor")
 
@@ -346,9 +1857,109 @@ class TerminalSession:
                 self.running = False
                 break
 
+        if self._shell is not None:
+            self._shell.close()
+
+    async def start_async(self) -> None:
+        """
+        Start the terminal session inside a running event loop.
+
+        Input is read in a worker thread. Callbacks run in the background, so
+        slow callbacks overlap with waiting for the next command instead of
+        delaying the prompt.
+
+        Unlike start, Ctrl+C ends the session: under asyncio.run it cancels the
+        main task, rather than raising KeyboardInterrupt where it can be caught.
+        """
+        loop = asyncio.get_running_loop()
+        pending: Set[asyncio.Future[None]] = set()
+        self.running = True
+        print("Terminal Extensions Activated")
+
+        while self.running:
+            try:
+                command = (await loop.run_in_executor(None, self._input, self.prompt)).strip()
+
+                if not command:
+                    continue
+
+                if command.lower() in ("exit", "quit"):
+                    self.running = False
+                    break
+
+                modified_command = _run_interceptors(command)
+                if modified_command is None:
+                    print("Command was blocked by an interceptor")
+                    continue
+
+                stream_callbacks = tuple(registry.iter_matching_stream_callbacks(command))
+                if stream_callbacks:
+                    stream_execute = (
+                        self._shell.iter_run if self._shell is not None else iterable_execute
+                    )
+                    result = await loop.run_in_executor(
+                        None,
+                        _execute_streaming,
+                        command,
+                        modified_command,
+                        False,
+                        stream_callbacks,
+                        stream_execute,
+                    )
+                elif self._shell is not None:
+                    result = await loop.run_in_executor(None, self._shell.run, modified_command)
+                else:
+                    result = await execute_command_async(modified_command)
+
+                task = asyncio.ensure_future(_run_callbacks_async(command, *result))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            except EOFError:
+                # handle Ctrl+D (EOF)
+                self.running = False
+                break
+            except Exception as e:
+                print(f"Error in terminal session: {e}", file=sys.stderr)
+                self.running = False
+                break
+
+        if pending:
+            await asyncio.gather(*pending)
+        if self._shell is not None:
+            self._shell.close()
+
+    def run_batch(self, lines: Iterable[str]) -> None:
+        """
+        Run commands read from a script or pipe instead of interactively.
+
+        All commands up to the end of input (or exit/quit) are executed by
+        process_commands in a single shell.
+
+        Args:
+            lines: Lines of input, one command per line
+        """
+        commands = []
+        for line in lines:
+            command = line.strip()
+            if not command:
+                continue
+            if command.lower() in ("exit", "quit"):
+                break
+            commands.append(command)
+
+        results = process_commands(commands)
+        for result in results:
+            if result is None:
+                print("Command was blocked by an interceptor")
+        if len(results) < len(commands):
+            print(f"Shell exited, {len(commands) - len(results)} commands were not run")
+
     def stop(self) -> None:
         """Stop the terminal session."""
         self.running = False
+        if self._shell is not None:
+            self._shell.close()
 
 
 def main() -> None:
@@ -361,10 +1972,13 @@ def main() -> None:
     # default hooks directory is in the current working directory
     hooks_dir = Path(".hooks")
 
-    # create terminal session and start it
+    # create terminal session and start it, running piped input as one batch
     terminal = TerminalSession(hooks_directory=hooks_dir)
     try:
-        terminal.start()
+        if sys.stdin.isatty():
+            terminal.start()
+        else:
+            terminal.run_batch(sys.stdin)
     except Exception as e:
         print(f"Terminal session error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -1,5 +1,10 @@
-from typing import Callable, Optional, Union
+from typing import Awaitable, Callable, Generator, Optional, Tuple, Union
 
 CommandStr = str
 InterceptorFunc = Callable[[CommandStr], Union[bool, CommandStr]]
 CallbackFunc = Callable[[CommandStr, int, Optional[str], Optional[str]], None]
+InterceptorChainFunc = Callable[[CommandStr], Optional[CommandStr]]
+ExecuteFunc = Callable[[CommandStr, bool], Tuple[int, Optional[str], Optional[str]]]
+AsyncExecuteFunc = Callable[[CommandStr, bool], Awaitable[Tuple[int, Optional[str], Optional[str]]]]
+OutputChunk = Tuple[str, bytes]
+StreamExecuteFunc = Callable[[CommandStr], Generator[OutputChunk, None, int]]
@@ -5,23 +5,37 @@ This module contains comprehensive tests for both the interceptor and callback
 hook functionality, ensuring proper registration, execution, and error handling.
 """
 
+import dataclasses
+import errno
+import importlib.util
 import os
+import shutil
+import signal
 import sys
 import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import List, Optional, Tuple, cast
+from typing import Generator, List, Optional, Tuple, cast
 
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 from terminal_extensions.cli import (
-    HookRegistry,
     registry,
     terminal_interceptor,
     terminal_callback,
+    terminal_stream_callback,
+    StreamingCallback,
     process_command,
+    process_command_async,
+    process_commands,
     load_hooks_from_directory,
     execute_command,
+    execute_command_async,
+    iterable_execute,
+    consume_output,
+    PersistentShell,
     TerminalSession,
 )
 
@@ -30,13 +44,24 @@ from terminal_extensions.cli import (
 @pytest.fixture
 def clean_registry():
     """Provide a clean registry for each test."""
-    original_registry = registry
-    test_registry = HookRegistry()
-    # Replace the global registry instance
-    globals()["registry"] = test_registry
-    yield test_registry
-    # Restore the original registry
-    globals()["registry"] = original_registry
+    registry.clear()
+    yield registry
+    registry.clear()
+
+
+@pytest.fixture
+def stub_execute(monkeypatch):
+    """Replace execute_command with a stub that succeeds, recording its calls."""
+    calls: List[Tuple[str, bool]] = []
+
+    def execute(
+        command: str, capture_output: bool = False
+    ) -> Tuple[int, Optional[str], Optional[str]]:
+        calls.append((command, capture_output))
+        return 0, "", ""
+
+    monkeypatch.setattr("terminal_extensions.cli.execute_command", execute)
+    return calls
 
 
 # Tests for hook registration
@@ -133,10 +158,63 @@ class TestHookRegistration:
         assert len(clean_registry.get_interceptors()) == 0
         assert len(clean_registry.get_callbacks()) == 0
 
+    def test_registry_snapshot_invalidation(self, clean_registry):
+        """Test that hook snapshots are reused until the registry changes."""
+
+        @terminal_interceptor("git")
+        def git_hook(command: str) -> bool:
+            return True
+
+        snapshot = clean_registry.get_interceptors()
+        assert clean_registry.get_interceptors() is snapshot
+
+        @terminal_interceptor("ls")
+        def ls_hook(command: str) -> bool:
+            return True
+
+        assert clean_registry.get_interceptors() == (("git", git_hook), ("ls", ls_hook))
+        assert snapshot == (("git", git_hook),)
+
+    def test_registry_batch(self, clean_registry, stub_execute):
+        """Test that hooks registered in a batch are dispatched once the batch exits."""
+        called: List[str] = []
+
+        with clean_registry.batch():
+
+            @terminal_interceptor("git")
+            def git_hook(command: str) -> bool:
+                called.append("git")
+                return True
+
+            with clean_registry.batch():
+
+                @terminal_interceptor()
+                def global_hook(command: str) -> bool:
+                    called.append("global")
+                    return True
+
+        assert len(clean_registry.get_interceptors()) == 2
+        process_command("git status")
+        assert called == ["git", "global"]
+
 
 # Tests for interceptor functionality
 class TestInterceptors:
-    def test_global_interceptor(self, clean_registry):
+    def test_registry_batch_detects_modification(self, clean_registry):
+        """Test that registering during iteration is detected inside a batch too."""
+
+        @terminal_interceptor()
+        def first(command: str) -> bool:
+            return True
+
+        with clean_registry.batch():
+            with pytest.raises(RuntimeError, match="hooks modified during dispatch"):
+                for index, _ in enumerate(clean_registry.iter_interceptors()):
+                    if index:
+                        break
+                    terminal_interceptor()(lambda command: True)
+
+    def test_global_interceptor(self, clean_registry, stub_execute):
         """Test that global interceptors are called for all commands."""
         called: List[str] = []
 
@@ -145,13 +223,12 @@ class TestInterceptors:
             called.append(command)
             return True
 
-        with patch("terminal_extensions.cli.execute_command", return_value=(0, "", "")):
-            process_command("any command")
-            process_command("another command")
+        process_command("any command")
+        process_command("another command")
 
         assert called == ["any command", "another command"]
 
-    def test_prefix_interceptor(self, clean_registry):
+    def test_prefix_interceptor(self, clean_registry, stub_execute):
         """Test that prefix interceptors are only called for matching commands."""
         called: List[str] = []
 
@@ -160,13 +237,77 @@ class TestInterceptors:
             called.append(command)
             return True
 
-        with patch("terminal_extensions.cli.execute_command", return_value=(0, "", "")):
-            process_command("git status")
-            process_command("other command")
+        process_command("git status")
+        process_command("other command")
 
         assert called == ["git status"]
 
-    def test_interceptor_chain_stopping(self, clean_registry):
+    def test_interceptor_registration_order(self, clean_registry, stub_execute):
+        """Test that matching interceptors run in registration order across prefixes."""
+        called: List[str] = []
+
+        @terminal_interceptor("git status")
+        def git_status_hook(command: str) -> bool:
+            called.append("git status")
+            return True
+
+        @terminal_interceptor()
+        def global_hook(command: str) -> bool:
+            called.append("global")
+            return True
+
+        @terminal_interceptor("git")
+        def git_hook(command: str) -> bool:
+            called.append("git")
+            return True
+
+        @terminal_interceptor("gh")
+        def gh_hook(command: str) -> bool:
+            called.append("gh")
+            return True
+
+        process_command("git status --short")
+
+        assert called == ["git status", "global", "git"]
+
+    def test_prefix_longer_than_command(self, clean_registry, stub_execute):
+        """Test that a prefix only matches commands at least as long as itself."""
+        called: List[str] = []
+
+        @terminal_interceptor("git")
+        def git_hook(command: str) -> bool:
+            called.append(command)
+            return True
+
+        process_command("gi")
+        process_command("g")
+        process_command("git")
+        process_command("gitk")
+
+        assert called == ["git", "gitk"]
+
+    def test_prefix_classification_updates(self, clean_registry, stub_execute):
+        """Test that prefixes are matched literally and re-indexed on registration."""
+        called: List[str] = []
+
+        @terminal_interceptor("c")
+        def c_hook(command: str) -> bool:
+            called.append("c")
+            return True
+
+        process_command("c++ main.cpp")
+
+        @terminal_interceptor("c++")
+        def cpp_hook(command: str) -> bool:
+            called.append("c++")
+            return True
+
+        process_command("c++ main.cpp")
+        process_command("cc main.c")
+
+        assert called == ["c", "c", "c++", "c"]
+
+    def test_interceptor_chain_stopping(self, clean_registry, stub_execute):
         """Test that the interceptor chain stops when a hook returns False."""
         called: List[int] = []
 
@@ -180,38 +321,108 @@ class TestInterceptors:
             called.append(2)
             return True
 
-        with patch("terminal_extensions.cli.execute_command", return_value=(0, "", "")):
-            result = process_command("test")
+        result = process_command("test")
 
         assert called == [1]
         assert result is None  # Command execution should be blocked
+        assert stub_execute == []
 
-    def test_interceptor_command_modification(self, clean_registry):
+    def test_interceptor_command_modification(self, clean_registry, stub_execute):
         """Test that interceptors can modify commands."""
 
         @terminal_interceptor()
         def modify_command(command: str) -> str:
             return "modified command"
 
-        with patch(
-            "terminal_extensions.cli.execute_command", return_value=(0, "", "")
-        ) as mock_execute:
-            process_command("original command")
+        process_command("original command")
+
+        assert stub_execute == [("modified command", False)]
+
+    def test_cached_interceptor(self, clean_registry, stub_execute):
+        """Test that cached interceptors are only called once per distinct command."""
+        called: List[str] = []
+
+        @terminal_interceptor("git", cache=True)
+        def add_pager_flag(command: str) -> str:
+            called.append(command)
+            return command + " --no-pager"
+
+        assert clean_registry.get_interceptors() == (("git", add_pager_flag),)
+        assert clean_registry.is_cached(add_pager_flag)
+
+        process_command("git log")
+        process_command("git log")
+        process_command("git status")
+
+        assert called == ["git log", "git status"]
+        assert stub_execute[1] == ("git log --no-pager", False)
+
+        clean_registry.clear_caches()
+        process_command("git log")
+
+        assert called == ["git log", "git status", "git log"]
+
+    def test_interceptor_chain_reuse(self, clean_registry):
+        """Test that compiled interceptor chains are reused until the registry changes."""
+
+        @terminal_interceptor("git")
+        def git_hook(command: str) -> str:
+            return command + " --no-pager"
 
-        mock_execute.assert_called_once_with("modified command", False)
+        chain = clean_registry.interceptor_chain("git log")
+        assert clean_registry.interceptor_chain("git status") is chain
+        assert chain("git log") == "git log --no-pager"
+        assert clean_registry.interceptor_chain("ls")("ls") == "ls"
 
-    def test_interceptor_exception_handling(self, clean_registry):
+        @terminal_interceptor()
+        def block_all(command: str) -> bool:
+            return False
+
+        new_chain = clean_registry.interceptor_chain("git log")
+        assert new_chain is not chain
+        assert new_chain("git log") is None
+
+    def test_unhashable_interceptor(self, clean_registry, stub_execute):
+        """Test that interceptors do not need to be hashable."""
+
+        @dataclasses.dataclass
+        class Deny:
+            prefix: str
+
+            def __call__(self, command: str) -> bool:
+                return not command.startswith(self.prefix)
+
+        clean_registry.register_interceptor(Deny("rm"))
+
+        assert process_command("rm -rf /") is None
+        assert process_command("ls") == (0, "", "")
+
+    def test_interceptor_exception_handling(self, clean_registry, stub_execute, capsys):
         """Test that exceptions in interceptors are properly handled."""
 
         @terminal_interceptor()
         def failing_hook(command: str) -> bool:
             raise ValueError("Test error")
 
-        with patch("terminal_extensions.cli.execute_command", return_value=(0, "", "")):
-            with patch("sys.stderr"):  # Suppress error output
-                process_command("test")
+        process_command("test")
+
+        assert "Test error" in capsys.readouterr().err
+
+    def test_interceptor_exception_continues_chain(self, clean_registry, stub_execute, capsys):
+        """Test that a failing interceptor is reported and the remaining ones still run."""
+
+        @terminal_interceptor()
+        def failing_hook(command: str) -> bool:
+            raise ValueError("Test error")
+
+        @terminal_interceptor()
+        def modify_command(command: str) -> str:
+            return "modified " + command
+
+        process_command("test")
 
-        assert True  # The fact that we got here means the exception was handled
+        assert stub_execute == [("modified test", False)]
+        assert "Error in interceptor failing_hook: Test error" in capsys.readouterr().err
 
 
 # Tests for callback functionality
@@ -234,7 +445,7 @@ class TestCallbacks:
         assert len(callback_calls) == 1
         assert callback_calls[0] == ("test command", 0, "output", "")
 
-    def test_prefix_callback(self, clean_registry):
+    def test_prefix_callback(self, clean_registry, stub_execute):
         """Test that prefix callbacks are only called for matching commands."""
         callback_calls = []
 
@@ -244,13 +455,111 @@ class TestCallbacks:
         ) -> None:
             callback_calls.append(command)
 
-        with patch("terminal_extensions.cli.execute_command", return_value=(0, "", "")):
-            process_command("git status")
-            process_command("other command")
+        process_command("git status")
+        process_command("other command")
 
         assert callback_calls == ["git status"]
 
-    def test_callback_exception_handling(self, clean_registry):
+    def test_nested_prefix_callbacks(self, clean_registry, stub_execute):
+        """Test that callbacks on nested prefixes all fire, in registration order."""
+        called: List[str] = []
+
+        @terminal_callback("git status")
+        def git_status_callback(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            called.append("git status")
+
+        @terminal_callback("git")
+        def git_callback(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            called.append("git")
+
+        process_command("git status -s")
+        process_command("git log")
+
+        assert called == ["git status", "git", "git"]
+
+    def test_callback_registered_after_dispatch(self, clean_registry, stub_execute):
+        """Test that callbacks registered after a command was dispatched apply to it."""
+        callback_calls: List[str] = []
+        process_command("git log")
+
+        @terminal_callback("git")
+        def git_callback(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            callback_calls.append(command)
+
+        process_command("git log")
+        assert callback_calls == ["git log"]
+
+    def test_stream_callback(self, clean_registry):
+        """Test that streaming callbacks receive output while legacy callbacks get it whole."""
+        chunks: List[Tuple[str, bytes]] = []
+        finished: List[Tuple[str, int]] = []
+        callback_calls = []
+
+        @terminal_stream_callback("echo")
+        class Recorder(StreamingCallback):
+            def on_chunk(self, command: str, stream: str, data: bytes) -> None:
+                chunks.append((stream, data))
+
+            def on_finish(self, command: str, return_code: int) -> None:
+                finished.append((command, return_code))
+
+        @terminal_callback()
+        def record_callback(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            callback_calls.append((command, return_code, stdout, stderr))
+
+        def fake_stream_execute(command: str) -> Generator[Tuple[str, bytes], None, int]:
+            yield "stdout", b"out\n"
+            yield "stderr", b"err\n"
+            return 0
+
+        result = process_command(
+            "echo out; echo err >&2", capture_output=True, stream_execute=fake_stream_execute
+        )
+
+        assert result == (0, "out\n", "err\n")
+        assert chunks == [("stdout", b"out\n"), ("stderr", b"err\n")]
+        assert finished == [("echo out; echo err >&2", 0)]
+        assert callback_calls == [("echo out; echo err >&2", 0, "out\n", "err\n")]
+
+    def test_callback_registering_during_dispatch(self, clean_registry, stub_execute):
+        """Test that registering hooks while callbacks are dispatched is safe."""
+        calls = []
+
+        @terminal_callback()
+        def register_more(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            calls.append(("register_more", command))
+            if command == "first":
+                terminal_callback()(lambda command, *args: calls.append(("added", command)))
+
+        @terminal_callback()
+        def second(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            calls.append(("second", command))
+
+        process_command("first")
+        process_command("next")
+
+        # the callback registered during dispatch applies from the next command
+        assert calls == [
+            ("register_more", "first"),
+            ("second", "first"),
+            ("register_more", "next"),
+            ("second", "next"),
+            ("added", "next"),
+        ]
+
+    def test_callback_exception_handling(self, clean_registry, stub_execute, capsys):
         """Test that exceptions in callbacks are properly handled."""
 
         @terminal_callback()
@@ -259,15 +568,69 @@ class TestCallbacks:
         ) -> None:
             raise ValueError("Test error")
 
-        with patch("terminal_extensions.cli.execute_command", return_value=(0, "", "")):
-            with patch("sys.stderr"):  # Suppress error output
-                process_command("test")
+        process_command("test")
 
-        assert True  # The fact that we got here means the exception was handled
+        assert "Error in callback failing_callback: Test error" in capsys.readouterr().err
 
 
 # Tests for command execution
 class TestCommandExecution:
+    @pytest.mark.skipif(sys.platform == "win32", reason="patches the POSIX spawn path")
+    def test_execute_command_mocked(self):
+        """Test that commands are spawned directly or through the shell as needed."""
+        with patch(
+            "terminal_extensions.cli._posix_spawn_command", return_value=(0, "test\n", "")
+        ) as spawn:
+            result = execute_command("echo  test", capture_output=True)
+            execute_command("echo\ta\xa0b")
+            execute_command("echo $HOME > out.txt")
+            execute_command("cd /tmp")
+            execute_command("read line")
+
+        assert result == (0, "test\n", "")
+        assert [call.args for call in spawn.call_args_list] == [
+            (("echo", "test"), True),
+            (("echo", "a\xa0b"), False),
+            ((ANY, "-c", "echo $HOME > out.txt"), False),
+            ((ANY, "-c", "cd /tmp"), False),
+            ((ANY, "-c", "read line"), False),
+        ]
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="patches the POSIX spawn path")
+    def test_execute_command_script_without_shebang(self):
+        """Test that programs the kernel cannot execute are run by the shell instead."""
+        with patch(
+            "terminal_extensions.cli._posix_spawn_command",
+            side_effect=[OSError(errno.ENOEXEC, "Exec format error"), (0, "hi\n", "")],
+        ) as spawn:
+            result = execute_command("./script.sh arg", capture_output=True)
+
+        assert result == (0, "hi\n", "")
+        assert spawn.call_args.args == ((ANY, "-c", "./script.sh arg"), True)
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="patches the POSIX spawn path")
+    def test_execute_command_missing_program(self):
+        """Test that a program that does not exist is reported like the shell does."""
+        with patch(
+            "terminal_extensions.cli._posix_spawn_command", side_effect=FileNotFoundError
+        ):
+            result = execute_command("nonexistent_command_12345", capture_output=True)
+
+        assert result == (127, "", "nonexistent_command_12345: not found\n")
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="patches the POSIX spawn path")
+    def test_execute_command_spawn_error(self, capsys):
+        """Test that a command that cannot be started is reported, not raised."""
+        with patch(
+            "terminal_extensions.cli._posix_spawn_command",
+            side_effect=OSError("spawn failed"),
+        ):
+            result = execute_command("echo test", capture_output=True)
+
+        assert result == (1, None, "spawn failed")
+        assert "Error executing command: spawn failed" in capsys.readouterr().err
+
+    @pytest.mark.slow
     def test_execute_command_success(self):
         """Test that commands are properly executed."""
         # Use 'echo' as a simple cross-platform command
@@ -278,6 +641,15 @@ class TestCommandExecution:
         assert "test" in stdout
         assert stderr == ""
 
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_execute_command_restores_signals(self):
+        """Test that commands get default signal handling instead of Python's ignored signals."""
+        result = execute_command("yes | head -1", capture_output=True)
+
+        assert result == (0, "y\n", "")
+
+    @pytest.mark.slow
     def test_execute_command_failure(self):
         """Test that command failures are properly handled."""
         # Use a non-existent command
@@ -288,6 +660,234 @@ class TestCommandExecution:
         assert return_code != 0
         assert stderr is not None
 
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_persistent_shell_keeps_state(self, tmp_path):
+        """Test that shell state carries over between commands in a persistent shell."""
+        shell = PersistentShell()
+        try:
+            assert shell.run(f"cd {tmp_path}; GREETING=hello", capture_output=True)[0] == 0
+            return_code, stdout, stderr = shell.run('pwd; echo "$GREETING"', capture_output=True)
+        finally:
+            shell.close()
+
+        assert return_code == 0
+        assert stdout == f"{os.path.realpath(tmp_path)}\nhello\n"
+        assert stderr == ""
+
+    @pytest.mark.slow
+    def test_iterable_execute(self):
+        """Test that command output is yielded as chunks followed by the return code."""
+        chunks: List[Tuple[str, bytes]] = []
+        return_code = consume_output(
+            iterable_execute("echo test; exit 2"),
+            lambda stream, data: chunks.append((stream, data)),
+        )
+
+        assert return_code == 2
+        assert b"".join(data for _, data in chunks).strip() == b"test"
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_persistent_shell_streams_large_output(self):
+        """Test that a persistent shell streams output larger than a pipe buffer."""
+        shell = PersistentShell()
+        received: List[bytes] = []
+        try:
+            return_code = consume_output(
+                shell.iter_run("head -c 200000 /dev/zero"), lambda _, data: received.append(data)
+            )
+        finally:
+            shell.close()
+
+        assert return_code == 0
+        assert len(b"".join(received)) == 200000
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_persistent_shell_restarts_after_exit(self):
+        """Test that a persistent shell reports the exit status and restarts after exit."""
+        shell = PersistentShell()
+        try:
+            assert shell.run("exit 3") == (3, None, None)
+            assert shell.run("echo again", capture_output=True) == (0, "again\n", "")
+        finally:
+            shell.close()
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(not os.path.exists("/bin/sh"), reason="requires /bin/sh")
+    def test_persistent_shell_survives_syntax_error(self, tmp_path):
+        """Test that a syntax error in a command does not exit the shell and lose its state."""
+        shell = PersistentShell("/bin/sh")
+        try:
+            shell.run(f"cd {tmp_path}")
+            shell.run("X=kept")
+            assert shell.run("echo 'oops", capture_output=True)[0] != 0
+            assert shell.run('pwd; echo "$X"', capture_output=True) == (
+                0,
+                f"{tmp_path}\nkept\n",
+                "",
+            )
+        finally:
+            shell.close()
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(shutil.which("zsh") is None, reason="requires zsh")
+    def test_persistent_shell_zsh(self):
+        """Test that commands run in zsh, whose command builtin skips builtins by default."""
+        shell = PersistentShell(shutil.which("zsh"))
+        try:
+            assert shell.run("cd /; pwd", capture_output=True) == (0, "/\n", "")
+        finally:
+            shell.close()
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    @pytest.mark.parametrize("shell_path", ["/bin/sh", "/bin/bash"])
+    def test_persistent_shell_survives_sigint(self, tmp_path, shell_path):
+        """Test that the shell keeps its state when Ctrl+C signals it as well."""
+        if not os.path.exists(shell_path):
+            pytest.skip(f"requires {shell_path}")
+        shell = PersistentShell(shell_path)
+        try:
+            shell.run(f"cd {tmp_path}; X=kept")
+
+            # signalled while idle, and while waiting for a command
+            os.kill(shell._pid, signal.SIGINT)
+            timer = threading.Timer(0.1, os.kill, (shell._pid, signal.SIGINT))
+            timer.start()
+            assert shell.run("sleep 0.3; echo done", capture_output=True) == (0, "done\n", "")
+            timer.join()
+
+            assert shell.run('pwd; echo "$X"', capture_output=True) == (
+                0,
+                f"{tmp_path}\nkept\n",
+                "",
+            )
+        finally:
+            shell.close()
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires SIGALRM")
+    @pytest.mark.parametrize("capture_output", [False, True])
+    def test_persistent_shell_recovers_from_interrupt(self, capture_output):
+        """Test that an interrupted command's status is never read by a later command."""
+
+        def interrupt(signum, frame):
+            raise KeyboardInterrupt
+
+        shell = PersistentShell()
+        previous_handler = signal.signal(signal.SIGALRM, interrupt)
+        try:
+            shell.run("X=kept")
+
+            # finishes shortly after the interrupt, so the shell is kept
+            signal.setitimer(signal.ITIMER_REAL, 0.05)
+            with pytest.raises(KeyboardInterrupt):
+                shell.run("sleep 0.2; (exit 7)", capture_output)
+            assert shell.run('test "$X" = kept', capture_output)[0] == 0
+
+            # still running long after the interrupt, so the shell is killed
+            signal.setitimer(signal.ITIMER_REAL, 0.05)
+            with pytest.raises(KeyboardInterrupt):
+                shell.run("sleep 5; (exit 7)", capture_output)
+            assert shell.run("(exit 3)", capture_output)[0] == 3
+            assert shell.run("(exit 0)", capture_output)[0] == 0
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+            shell.close()
+
+
+# Tests for asynchronous command processing
+class TestAsyncCommandProcessing:
+    @pytest.mark.slow
+    @pytest.mark.asyncio
+    async def test_execute_command_async(self):
+        """Test that commands are executed asynchronously."""
+        return_code, stdout, stderr = await execute_command_async("echo test", capture_output=True)
+
+        assert return_code == 0
+        assert stdout is not None
+        assert "test" in stdout
+        assert stderr == ""
+
+    @pytest.mark.asyncio
+    async def test_process_command_async(self, clean_registry):
+        """Test that interceptors and callbacks run around an asynchronous execution."""
+        executed: List[str] = []
+        callback_calls = []
+
+        @terminal_interceptor()
+        def modify_command(command: str) -> str:
+            return "modified " + command
+
+        @terminal_callback()
+        def record_callback(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            callback_calls.append((command, return_code, stdout))
+
+        async def fake_execute(
+            command: str, capture_output: bool
+        ) -> Tuple[int, Optional[str], Optional[str]]:
+            executed.append(command)
+            return 0, "output", ""
+
+        result = await process_command_async("original", execute=fake_execute)
+
+        assert result == (0, "output", "")
+        assert executed == ["modified original"]
+        assert callback_calls == [("original", 0, "output")]
+
+    @pytest.mark.asyncio
+    async def test_process_command_async_streams(self, clean_registry):
+        """Test that streaming callbacks receive output from asynchronous executions."""
+        chunks: List[Tuple[str, bytes]] = []
+        finished: List[Tuple[str, int]] = []
+
+        @terminal_stream_callback("echo")
+        class Recorder(StreamingCallback):
+            def on_chunk(self, command: str, stream: str, data: bytes) -> None:
+                chunks.append((stream, data))
+
+            def on_finish(self, command: str, return_code: int) -> None:
+                finished.append((command, return_code))
+
+        def fake_stream_execute(command: str) -> Generator[Tuple[str, bytes], None, int]:
+            yield "stdout", b"out\n"
+            yield "stderr", b"err\n"
+            return 3
+
+        result = await process_command_async(
+            "echo out", capture_output=True, stream_execute=fake_stream_execute
+        )
+
+        assert result == (3, "out\n", "err\n")
+        assert chunks == [("stdout", b"out\n"), ("stderr", b"err\n")]
+        assert finished == [("echo out", 3)]
+
+    @pytest.mark.slow
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    async def test_start_async_streams(self, clean_registry, capfd):
+        """Test that an asynchronous session streams output to streaming callbacks."""
+        chunks: List[bytes] = []
+        commands = iter(["echo streamed"])
+
+        def read_command(prompt: str) -> str:
+            return next(commands, "exit")
+
+        @terminal_stream_callback("echo")
+        class Recorder(StreamingCallback):
+            def on_chunk(self, command: str, stream: str, data: bytes) -> None:
+                chunks.append(data)
+
+        await TerminalSession(input_fn=read_command).start_async()
+
+        assert b"".join(chunks) == b"streamed\n"
+        assert "streamed" in capfd.readouterr().out
+
 
 # Tests for hook loading from directory
 class TestHookLoading:
@@ -324,12 +924,154 @@ def test_callback(command: str, return_code: int, stdout: Optional[str], stderr:
         assert len(clean_registry.get_interceptors()) == 1
         assert len(clean_registry.get_callbacks()) == 1
 
+    def test_load_hooks_skips_unchanged_files(self, clean_registry, tmp_path):
+        """Test that reloading a directory only re-executes modified hook files."""
+        hook_dir = tmp_path / ".hooks"
+        hook_dir.mkdir()
+
+        hook_file = hook_dir / "test_hooks.py"
+        hook_file.write_text(
+            """
+from terminal_extensions.cli import terminal_interceptor
+
+@terminal_interceptor("test")
+def test_interceptor(command: str) -> bool:
+    return True
+"""
+        )
+
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 1
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 0
+        assert len(clean_registry.get_interceptors()) == 1
+
+        # bump the modification time so the file is picked up again
+        stat = hook_file.stat()
+        os.utime(hook_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 1
+
+        # a rewrite that keeps the modification time is picked up by its size
+        stat = hook_file.stat()
+        hook_file.write_text(hook_file.read_text() + "\n")
+        os.utime(hook_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 1
+
+    def test_load_hooks_restores_cleared_hooks(self, clean_registry, tmp_path):
+        """Test that an unchanged hook file's hooks come back after the registry is cleared."""
+        hook_dir = tmp_path / ".hooks"
+        hook_dir.mkdir()
+
+        (hook_dir / "test_hooks.py").write_text(
+            """
+from terminal_extensions.cli import terminal_interceptor
+
+@terminal_interceptor("test")
+def test_interceptor(command: str) -> bool:
+    return True
+"""
+        )
+
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 1
+        interceptors = clean_registry.get_interceptors()
+
+        clean_registry.clear()
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 1
+        # the same function objects are registered, so the file was not executed again
+        assert clean_registry.get_interceptors() == interceptors
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 0
+
+    def test_load_hooks_restores_cached_interceptors(self, clean_registry, tmp_path):
+        """Test that interceptors restored after clearing the registry stay cached."""
+        hook_dir = tmp_path / ".hooks"
+        hook_dir.mkdir()
+
+        (hook_dir / "test_hooks.py").write_text(
+            """
+from terminal_extensions.cli import terminal_interceptor
+
+@terminal_interceptor("test", cache=True)
+def test_interceptor(command: str) -> bool:
+    return True
+"""
+        )
+
+        load_hooks_from_directory(hook_dir)
+        ((_, interceptor),) = clean_registry.get_interceptors()
+
+        clean_registry.clear()
+        load_hooks_from_directory(hook_dir)
+
+        assert clean_registry.get_interceptors() == (("test", interceptor),)
+        assert clean_registry.is_cached(interceptor)
+
+    def test_load_hooks_registers_module(self, clean_registry, tmp_path):
+        """Test that hook files can use code that looks up their own module."""
+        hook_dir = tmp_path / ".hooks"
+        hook_dir.mkdir()
+
+        (hook_dir / "test_hooks.py").write_text(
+            """
+from __future__ import annotations
+
+import dataclasses
+import sys
+
+from terminal_extensions.cli import terminal_interceptor
+
+@dataclasses.dataclass
+class Alias:
+    name: str
+    expansion: str
+
+ALIAS = Alias("gs", "git status")
+
+@terminal_interceptor(ALIAS.name)
+def expand_alias(command: str) -> str:
+    return ALIAS.expansion + command[len(ALIAS.name) :]
+
+assert sys.modules[__name__].ALIAS is ALIAS
+"""
+        )
+
+        assert load_hooks_from_directory(hook_dir)["interceptors"] == 1
+        assert clean_registry.interceptor_chain("gs")("gs -s") == "git status -s"
+
+    @pytest.mark.skipif(sys.dont_write_bytecode, reason="bytecode writing is disabled")
+    def test_load_hooks_caches_bytecode(self, clean_registry, tmp_path):
+        """Test that hook files are compiled once and their bytecode cached on disk."""
+        hook_dir = tmp_path / ".hooks"
+        hook_dir.mkdir()
+
+        hook_file = hook_dir / "test_hooks.py"
+        hook_file.write_text(
+            """
+from terminal_extensions.cli import terminal_interceptor
+
+@terminal_interceptor("test")
+def test_interceptor(command: str) -> bool:
+    return True
+"""
+        )
+
+        load_hooks_from_directory(hook_dir)
+        assert os.path.exists(importlib.util.cache_from_source(str(hook_file)))
+
     def test_load_hooks_nonexistent_directory(self):
         """Test loading hooks from a non-existent directory."""
         with pytest.raises(FileNotFoundError):
             load_hooks_from_directory("/nonexistent/directory")
 
-    def test_load_hooks_with_errors(self, clean_registry, tmp_path):
+    def test_load_hooks_from_file(self, clean_registry, tmp_path):
+        """Test that a file in place of the hook directory loads no hooks."""
+        hook_file = tmp_path / ".hooks"
+        hook_file.write_text("")
+
+        assert load_hooks_from_directory(hook_file) == {
+            "interceptors": 0,
+            "callbacks": 0,
+            "stream_callbacks": 0,
+        }
+
+    def test_load_hooks_with_errors(self, clean_registry, tmp_path, capsys):
         """Test loading hooks from a directory with errors."""
         # Create a temporary hook file with syntax error
         hook_dir = tmp_path / ".hooks"
@@ -347,14 +1089,13 @@ def test_hook(command):
 """
         )
 
-        # Suppress stderr during the test
-        with patch("sys.stderr"):
-            # Should not raise exception
-            hook_counts = load_hooks_from_directory(hook_dir)
+        # Should not raise exception
+        hook_counts = load_hooks_from_directory(hook_dir)
 
         # Check that no hooks were loaded due to error
         assert hook_counts["interceptors"] == 0
         assert hook_counts["callbacks"] == 0
+        assert "Error loading hook file error_hooks.py" in capsys.readouterr().err
 
 
 # Tests for TerminalSession
@@ -365,6 +1106,16 @@ class TestTerminalSession:
         assert session.prompt == ">>> "
         assert session.running is False
 
+    def test_terminal_session_non_posix_shell(self, clean_registry, stub_execute, monkeypatch):
+        """Test that commands for a non-POSIX $SHELL are not run in a POSIX shell."""
+        monkeypatch.setattr("terminal_extensions.cli._DEFAULT_SHELL", "/usr/bin/fish")
+        commands = iter(["set x 1"])
+
+        with patch("builtins.print"):
+            TerminalSession(input_fn=lambda prompt: next(commands, "exit")).start()
+
+        assert stub_execute == [("set x 1", False)]
+
     def test_terminal_session_with_hooks_dir(self, tmp_path):
         """Test terminal session with hooks directory."""
         hook_dir = tmp_path / ".hooks"
@@ -396,11 +1147,8 @@ def test_hook(command: str) -> bool:
 
     def test_terminal_session_start_stop(self):
         """Test starting and stopping terminal session."""
-        session = TerminalSession()
-
-        # Mock input to return "exit" when called
-        with patch("builtins.input", return_value="exit"):
-            session.start()
+        session = TerminalSession(input_fn=lambda prompt: "exit")
+        session.start()
 
         assert session.running is False
 
@@ -451,36 +1199,160 @@ class TestIntegration:
         assert interceptor_called == ["original"]
         assert callback_called == [("original", 0)]
 
+    def test_process_command_without_hooks(self, clean_registry):
+        """Test that commands run unchanged when no hooks are registered."""
+        with patch(
+            "terminal_extensions.cli.execute_command", return_value=(0, "out", "")
+        ) as mock_execute:
+            result = process_command("echo test", capture_output=True)
+
+        mock_execute.assert_called_once_with("echo test", True)
+        assert result == (0, "out", "")
+
     def test_process_command_full_flow(self, clean_registry):
-        """Test the full flow of process_command with real command execution."""
-        interceptor_called = []
-        callback_called = []
+        """Test the full flow of process_command from interceptor to callback."""
+        events: List[Tuple[str, str]] = []
 
         @terminal_interceptor()
         def log_command(command: str) -> bool:
-            interceptor_called.append(command)
+            events.append(("interceptor", command))
             return True
 
         @terminal_callback()
         def log_result(
             command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
         ) -> None:
-            callback_called.append((command, return_code))
+            events.append(("callback", command))
+
+        def fake_execute(
+            command: str, capture_output: bool
+        ) -> Tuple[int, Optional[str], Optional[str]]:
+            events.append(("execute", command))
+            return 0, "test\n", ""
+
+        with patch("terminal_extensions.cli.execute_command", side_effect=fake_execute):
+            result = process_command("echo test", capture_output=True)
+
+        assert events == [
+            ("interceptor", "echo test"),
+            ("execute", "echo test"),
+            ("callback", "echo test"),
+        ]
+        assert result == (0, "test\n", "")
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_process_commands_batch(self, clean_registry, tmp_path):
+        """Test that batched commands share one shell and keep per-command results."""
+        callback_calls = []
+
+        @terminal_interceptor("rm")
+        def block_rm(command: str) -> bool:
+            return False
 
-        # Use a simple echo command that should work cross-platform
-        result = process_command("echo test", capture_output=True)
+        @terminal_callback()
+        def log_result(
+            command: str, return_code: int, stdout: Optional[str], stderr: Optional[str]
+        ) -> None:
+            callback_calls.append((command, return_code))
 
-        assert interceptor_called == ["echo test"]
-        assert len(callback_called) == 1
-        assert callback_called[0][0] == "echo test"
-        assert callback_called[0][1] == 0  # Success return code
+        results = process_commands(
+            [f"cd {tmp_path}", "rm -rf important", "pwd", "echo oops >&2; false"],
+            capture_output=True,
+        )
 
-        # Check results
-        assert result is not None
-        return_code, stdout, stderr = result
-        assert return_code == 0
-        assert stdout is not None
-        assert "test" in stdout
+        assert results == [
+            (0, "", ""),
+            None,
+            (0, f"{os.path.realpath(tmp_path)}\n", ""),
+            (1, "", "oops\n"),
+        ]
+        assert callback_calls == [
+            (f"cd {tmp_path}", 0),
+            ("pwd", 0),
+            ("echo oops >&2; false", 1),
+        ]
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_process_commands_batch_exit(self, clean_registry):
+        """Test that a command exiting the shell ends the batch."""
+        results = process_commands(["echo first", "exit 5", "echo never"], capture_output=True)
+
+        assert results == [(0, "first\n", ""), (5, "", "")]
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(not os.path.exists("/bin/sh"), reason="requires /bin/sh")
+    def test_process_commands_batch_many_open_fds(self, clean_registry, monkeypatch):
+        """Test that batches work in shells limited to single-digit fds."""
+        monkeypatch.setattr("terminal_extensions.cli._DEFAULT_SHELL", "/bin/sh")
+        open_fds = [os.open(os.devnull, os.O_RDONLY) for _ in range(10)]
+        try:
+            results = process_commands(["echo a", "echo b"], capture_output=True)
+        finally:
+            for fd in open_fds:
+                os.close(fd)
+
+        assert results == [(0, "a\n", ""), (0, "b\n", "")]
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(shutil.which("zsh") is None, reason="requires zsh")
+    def test_process_commands_batch_zsh(self, clean_registry, monkeypatch):
+        """Test that batches run in zsh, whose command builtin skips builtins by default."""
+        monkeypatch.setattr("terminal_extensions.cli._DEFAULT_SHELL", shutil.which("zsh"))
+
+        assert process_commands(["cd /", "pwd"], capture_output=True) == [
+            (0, "", ""),
+            (0, "/\n", ""),
+        ]
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    @pytest.mark.parametrize("capture_output", [False, True])
+    def test_process_commands_background_job(self, clean_registry, capture_output):
+        """Test that a batch does not wait for background jobs it started."""
+        start = time.monotonic()
+        results = process_commands(["sleep 3 &", "true"], capture_output=capture_output)
+
+        assert time.monotonic() - start < 2
+        assert [result[0] for result in results if result is not None] == [0, 0]
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_process_commands_warns_about_stream_callbacks(self, clean_registry, capfd):
+        """Test that batching warns that it skips streaming callbacks."""
+        chunks = []
+
+        @terminal_stream_callback(prefix="echo")
+        class Recorder(StreamingCallback):
+            def on_chunk(self, command: str, stream: str, data: bytes) -> None:
+                chunks.append(data)
+
+        results = process_commands(["echo a"], capture_output=True)
+
+        assert results == [(0, "a\n", "")]
+        assert chunks == []
+        assert "streaming callbacks are not run" in capfd.readouterr().err
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_process_commands_batch_syntax_error(self, clean_registry):
+        """Test that a command with a syntax error does not end the batch."""
+        results = process_commands(["echo a", "echo 'oops", "echo c"], capture_output=True)
+
+        assert len(results) == 3
+        assert results[1] is not None and results[1][0] != 0
+        assert results[2] == (0, "c\n", "")
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+    def test_run_batch_reports_unreached_commands(self, clean_registry, capfd):
+        """Test that commands after an exit are not reported as blocked."""
+        TerminalSession().run_batch(["echo first", "exit 0", "echo never", "echo nor"])
+
+        out = capfd.readouterr().out
+        assert "blocked" not in out
+        assert "Shell exited, 2 commands were not run" in out
 
 
 if __name__ == "__main__":